@@ -0,0 +1,13 @@
+"""Gunicorn settings, loaded automatically by `gunicorn run:application`
+when started from the project root.
+
+Message streams (/api/messages/stream) hold a request open for up to
+STREAM_MAX_SECONDS, so workers are threaded: an open stream pins one thread
+instead of a whole worker. Workers default to WEB_CONCURRENCY and the bind
+address to $PORT, as usual for gunicorn.
+"""
+
+import os
+
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", 32))
@@ -10,9 +10,10 @@ import os
 # Add server directory to path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), "server"))
 
-from app import app
+from app import create_app
 
-# This is needed for gunicorn
+# This is needed for gunicorn (safe with --preload: the app connects lazily per worker)
+app = create_app()
 application = app
 
 if __name__ == "__main__":
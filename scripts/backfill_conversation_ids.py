@@ -0,0 +1,67 @@
+"""
+Script to add conversationId to messages created before it was stored
+Run with: python scripts/backfill_conversation_ids.py [--batch-size 1000]
+          [--checkpoint backfill.ckpt] [--throttle 0.1] [--dry-run]
+
+Safe to re-run: only messages without a conversationId are updated
+"""
+
+import os
+import sys
+import argparse
+from dotenv import load_dotenv
+from pymongo import MongoClient, UpdateOne
+
+# Add server directory to path to import the Message model helpers
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "server"))
+
+from models.message import conversation_id
+from batch_runner import BatchRunner, add_batch_arguments
+
+load_dotenv()
+
+
+def backfill_conversation_ids(args):
+    """Set conversationId on every message missing it, one batch per round trip"""
+    try:
+        mongodb_uri = os.getenv("MONGODB_URI", "mongodb://localhost:27017/secret-santa")
+        client = MongoClient(mongodb_uri)
+        db = client.get_database()
+        messages_collection = db.messages
+
+        print("✅ Connected to MongoDB")
+
+        missing = {"conversationId": {"$exists": False}}
+
+        def backfill_chunk(range_filter, batch):
+            return messages_collection.bulk_write(
+                [
+                    UpdateOne(
+                        {"_id": msg["_id"]},
+                        {"$set": {
+                            "conversationId": conversation_id(msg["senderId"], msg["receiverId"])
+                        }},
+                    )
+                    for msg in batch
+                ],
+                ordered=False,
+            ).modified_count
+
+        runner = BatchRunner.from_args(
+            messages_collection, missing, args, projection={"senderId": 1, "receiverId": 1}
+        )
+        updated = runner.run(backfill_chunk)
+        if args.dry_run:
+            return
+
+        print(f"\n✅ Backfilled conversationId on {updated} message(s)")
+
+    except Exception as error:
+        print(f"❌ Fatal error: {error}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    add_batch_arguments(parser)
+    backfill_conversation_ids(parser.parse_args())
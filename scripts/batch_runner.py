@@ -0,0 +1,130 @@
+"""
+Shared chunked runner for the maintenance scripts
+
+Walks a collection in _id order, one chunk at a time, so no single
+operation holds the server for long. Each chunk is applied to its _id range,
+the last _id is saved to an optional checkpoint file so an interrupted run
+resumes where it stopped, and progress is printed as a periodic summary.
+"""
+
+import os
+import sys
+import time
+from bson import json_util
+
+
+def add_batch_arguments(parser, default_batch_size=1000):
+    """The options every batched script shares"""
+    parser.add_argument("--batch-size", type=int, default=default_batch_size, help="Documents per chunk")
+    parser.add_argument("--checkpoint", help="File recording progress; an existing one resumes the run")
+    parser.add_argument("--throttle", type=float, default=0.0, help="Seconds to sleep between chunks")
+    parser.add_argument("--dry-run", action="store_true", help="Count what would change without writing")
+    return parser
+
+
+class BatchRunner:
+    def __init__(self, collection, query=None, batch_size=1000, checkpoint=None,
+                 throttle=0.0, dry_run=False, projection=None, report_every=2.0):
+        self.collection = collection
+        self.query = query or {}
+        self.batch_size = max(1, batch_size)
+        self.checkpoint = checkpoint
+        self.throttle = throttle
+        self.dry_run = dry_run
+        self.projection = projection or {"_id": 1}
+        self.report_every = report_every
+
+    @classmethod
+    def from_args(cls, collection, query, args, projection=None):
+        return cls(
+            collection,
+            query,
+            batch_size=args.batch_size,
+            checkpoint=args.checkpoint,
+            throttle=args.throttle,
+            dry_run=args.dry_run,
+            projection=projection,
+        )
+
+    def _signature(self):
+        # A checkpoint only resumes the same job: same collection and filter
+        return json_util.dumps({"collection": self.collection.name, "query": self.query}, sort_keys=True)
+
+    def _load_checkpoint(self):
+        if not self.checkpoint or not os.path.exists(self.checkpoint):
+            return None, 0
+        with open(self.checkpoint) as f:
+            state = json_util.loads(f.read())
+        if state.get("signature") != self._signature():
+            print(f"⚠️  Checkpoint {self.checkpoint} is for a different job, starting over")
+            return None, 0
+        print(f"↩️  Resuming after _id {state['lastId']} ({state['processed']} already done)")
+        return state["lastId"], state["processed"]
+
+    def _save_checkpoint(self, last_id, processed):
+        if not self.checkpoint or self.dry_run:
+            return
+        state = {"signature": self._signature(), "lastId": last_id, "processed": processed}
+        tmp_path = f"{self.checkpoint}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(json_util.dumps(state))
+        os.replace(tmp_path, self.checkpoint)
+
+    def _clear_checkpoint(self):
+        if self.checkpoint and not self.dry_run and os.path.exists(self.checkpoint):
+            os.remove(self.checkpoint)
+
+    def _after(self, last_id):
+        if last_id is None:
+            return self.query
+        return {"$and": [self.query, {"_id": {"$gt": last_id}}]}
+
+    def run(self, apply):
+        """Apply `apply(range_filter, batch)` to each chunk and return the total it reports
+
+        range_filter is the job's query narrowed to the chunk's _id range, so
+        a single delete_many/update_many covers the chunk. batch holds the
+        chunk's documents (with the runner's projection). apply returns how
+        many documents it changed. In dry-run mode apply is never called and
+        the chunk sizes are counted instead.
+        """
+        last_id, processed = self._load_checkpoint()
+        total = processed + self.collection.count_documents(self._after(last_id))
+        print(f"📊 {total - processed} document(s) to process")
+
+        started = time.monotonic()
+        last_report = started
+        chunks = 0
+        while True:
+            batch = list(
+                self.collection.find(self._after(last_id), self.projection)
+                .sort("_id", 1)
+                .limit(self.batch_size)
+            )
+            if not batch:
+                break
+
+            first_id, last_id = batch[0]["_id"], batch[-1]["_id"]
+            range_filter = {"$and": [self.query, {"_id": {"$gte": first_id, "$lte": last_id}}]}
+            processed += len(batch) if self.dry_run else apply(range_filter, batch)
+            chunks += 1
+            self._save_checkpoint(last_id, processed)
+
+            now = time.monotonic()
+            if now - last_report >= self.report_every:
+                self._report(processed, total, started, now)
+                last_report = now
+            if self.throttle:
+                time.sleep(self.throttle)
+
+        self._clear_checkpoint()
+        elapsed = time.monotonic() - started
+        verb = "Would process" if self.dry_run else "Processed"
+        print(f"{verb} {processed} document(s) in {chunks} chunk(s), {elapsed:.1f}s")
+        return processed
+
+    def _report(self, processed, total, started, now):
+        rate = processed / max(now - started, 1e-9)
+        percent = 100 * processed / total if total else 100
+        print(f"   ...{processed}/{total} ({percent:.0f}%), {rate:.0f}/s")
+        sys.stdout.flush()
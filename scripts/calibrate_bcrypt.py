@@ -0,0 +1,40 @@
+"""
+Script to pick a bcrypt cost for this host
+Run with: python scripts/calibrate_bcrypt.py [--target-ms 250]
+
+Benchmarks bcrypt at increasing costs and prints the highest one that hashes
+within the target latency. Set it as BCRYPT_ROUNDS in your environment;
+existing keys are rehashed with the new cost the next time each user logs in.
+"""
+
+import os
+import sys
+import argparse
+
+# Add server directory to path to import the crypto service
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "server"))
+
+from services.crypto_pool import calibrate_rounds
+
+
+def calibrate(target_ms, min_rounds, max_rounds):
+    print(f"⏱️  Benchmarking bcrypt (target {target_ms} ms per hash)...\n")
+
+    rounds, timings = calibrate_rounds(target_ms, min_rounds, max_rounds)
+    for cost, millis in timings.items():
+        marker = "✅" if millis <= target_ms else "❌"
+        print(f"   {marker} cost {cost}: {millis:.0f} ms")
+
+    if timings[min_rounds] > target_ms:
+        print(f"\n⚠️  Even cost {min_rounds} is slower than the target; using it anyway")
+
+    print(f"\n📝 Recommended setting:\n\n   BCRYPT_ROUNDS={rounds}\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--target-ms", type=float, default=250)
+    parser.add_argument("--min-rounds", type=int, default=10)
+    parser.add_argument("--max-rounds", type=int, default=16)
+    args = parser.parse_args()
+    calibrate(args.target_ms, args.min_rounds, args.max_rounds)
@@ -1,20 +1,39 @@
 """
-Script to delete all messages from the database
-Run with: python scripts/clear_messages.py
+Script to delete messages from the database
+Run with: python scripts/clear_messages.py [--before 2025-01-01] [--dry-run]
+          [--batch-size 1000] [--checkpoint clear_messages.ckpt] [--throttle 0.1]
 
-This will permanently delete all message documents from the messages collection
+This will permanently delete message documents from the messages collection,
+all of them or only those created before --before. Deletes run in _id-range
+chunks; with --checkpoint an interrupted run picks up where it stopped.
 """
 
 import os
 import sys
+import argparse
+from datetime import datetime, timezone
 from dotenv import load_dotenv
 from pymongo import MongoClient
 
+# Add server directory to path to import the inbox model
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "server"))
+
+from models.inbox import InboxSummary
+from batch_runner import BatchRunner, add_batch_arguments
+
 load_dotenv()
 
 
-def clear_messages():
-    """Delete all messages from the database"""
+def parse_date(value):
+    """ISO date or datetime; naive values are taken as UTC"""
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def clear_messages(args):
+    """Delete messages in chunks, optionally only those older than a date"""
     try:
         # Connect to MongoDB
         mongodb_uri = os.getenv("MONGODB_URI", "mongodb://localhost:27017/secret-santa")
@@ -23,28 +42,35 @@ def clear_messages():
         messages_collection = db.messages
 
         print("✅ Connected to MongoDB")
-        
-        # Count messages before deletion
-        message_count = messages_collection.count_documents({})
-        print(f"\n📊 Found {message_count} message(s) in the database")
-        
-        if message_count == 0:
-            print("✅ No messages to delete")
+
+        query = {}
+        if args.before:
+            query["createdAt"] = {"$lt": args.before}
+            print(f"\n🗓️  Only messages created before {args.before.isoformat()}")
+
+        print("\n🗑️  Deleting messages..." if not args.dry_run else "\n🔍 Dry run, nothing is deleted")
+
+        def delete_chunk(range_filter, batch):
+            return messages_collection.delete_many(range_filter).deleted_count
+
+        deleted = BatchRunner.from_args(messages_collection, query, args).run(delete_chunk)
+
+        if args.dry_run:
             return
-        
-        print("\n🗑️  Deleting all messages...")
+        print(f"\n✅ Successfully deleted {deleted} message(s)")
 
-        # Delete all messages
-        result = messages_collection.delete_many({})
+        if not args.before:
+            # Nothing left to summarize; after a partial delete, rebuild them with
+            # scripts/rebuild_inbox_summaries.py if previews should drop old messages
+            InboxSummary(db).clear()
+            print("✅ Cleared inbox summaries")
 
-        print(f"\n✅ Successfully deleted {result.deleted_count} message(s)")
-        
         # Verify deletion
-        remaining_messages = messages_collection.count_documents({})
+        remaining_messages = messages_collection.count_documents(query)
         if remaining_messages == 0:
-            print("✅ Verification: All messages have been deleted")
+            print("✅ Verification: All matching messages have been deleted")
         else:
-            print(f"⚠️  Warning: {remaining_messages} message(s) still remain")
+            print(f"⚠️  Warning: {remaining_messages} matching message(s) still remain")
 
     except Exception as error:
         print(f"❌ Fatal error: {error}")
@@ -52,5 +78,7 @@ def clear_messages():
 
 
 if __name__ == "__main__":
-    clear_messages()
-
+    parser = argparse.ArgumentParser(description="Delete messages")
+    parser.add_argument("--before", type=parse_date, help="Only delete messages created before this date (ISO format)")
+    add_batch_arguments(parser)
+    clear_messages(parser.parse_args())
@@ -1,19 +1,31 @@
 """
 Script to clear all secret keys from users in the database
-Run with: python scripts/clear_secret_keys.py
+Run with: python scripts/clear_secret_keys.py [--dry-run] [--yes]
+          [--batch-size 1000] [--checkpoint clear_keys.ckpt] [--throttle 0.1]
 
-This will set all users' secretKey field to None
+This will set all users' secretKey field to None. Users are updated in
+_id-range chunks; with --checkpoint an interrupted run picks up where it stopped.
 """
 
 import os
 import sys
+import argparse
 from dotenv import load_dotenv
 from pymongo import MongoClient
 
+# Add server directory to path to import the User model
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "server"))
+
+from models.user import bump_roster_version
+from batch_runner import BatchRunner, add_batch_arguments
+
 load_dotenv()
 
+# Users that still carry a key or its lookup tag
+HAS_KEY = {"$or": [{"secretKey": {"$ne": None}}, {"secretKeyTag": {"$exists": True}}]}
 
-def clear_secret_keys():
+
+def clear_secret_keys(args):
     """Clear all secret keys from users"""
     try:
         # Connect to MongoDB
@@ -23,23 +35,29 @@ def clear_secret_keys():
         users_collection = db.users
 
         print("✅ Connected to MongoDB")
-        print("\n🔄 Clearing all secret keys...")
-
-        # Update all users to set secretKey to None
-        result = users_collection.update_many(
-            {},
-            {"$set": {"secretKey": None}}
-        )
-
-        print(f"\n✅ Successfully cleared secret keys for {result.modified_count} user(s)")
-        
-        # Show which users were updated
-        users = list(users_collection.find({}, {"name": 1, "secretKey": 1}))
-        if users:
-            print("\n📋 Updated users:")
-            for user in users:
-                key_status = "None" if user.get("secretKey") is None else "Still set"
-                print(f"   - {user['name']}: secretKey = {key_status}")
+        print("\n🔄 Clearing all secret keys..." if not args.dry_run else "\n🔍 Dry run, nothing is changed")
+
+        def clear_chunk(range_filter, batch):
+            return users_collection.update_many(
+                range_filter,
+                {"$set": {"secretKey": None}, "$unset": {"secretKeyTag": ""}},
+            ).modified_count
+
+        cleared = BatchRunner.from_args(users_collection, HAS_KEY, args).run(clear_chunk)
+
+        if args.dry_run:
+            return
+
+        # Tell running servers to reload their roster cache
+        bump_roster_version(db)
+
+        print(f"\n✅ Successfully cleared secret keys for {cleared} user(s)")
+
+        remaining = users_collection.count_documents(HAS_KEY)
+        if remaining == 0:
+            print("✅ Verification: No user has a secret key set")
+        else:
+            print(f"⚠️  Warning: {remaining} user(s) still have a secret key set")
 
     except Exception as error:
         print(f"❌ Fatal error: {error}")
@@ -47,14 +65,22 @@ def clear_secret_keys():
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Clear all secret keys")
+    parser.add_argument("--yes", action="store_true", help="Skip the confirmation prompt")
+    add_batch_arguments(parser)
+    args = parser.parse_args()
+
+    if args.dry_run or args.yes:
+        clear_secret_keys(args)
+        sys.exit(0)
+
     # Confirm before proceeding
     print("⚠️  WARNING: This will clear ALL secret keys for ALL users!")
     print("   Users will need to set their secret keys again.")
     response = input("\n   Continue? (yes/no): ")
     
     if response.lower() in ["yes", "y"]:
-        clear_secret_keys()
+        clear_secret_keys(args)
     else:
         print("\n❌ Operation cancelled.")
         sys.exit(0)
-
@@ -0,0 +1,58 @@
+"""
+Script to create the database indexes and check that model queries use them
+Run with: python scripts/ensure_indexes.py
+
+The server also creates these indexes on startup
+"""
+
+import os
+import sys
+from dotenv import load_dotenv
+from pymongo import MongoClient
+
+# Add server directory to path to import the index definitions
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "server"))
+
+from models.indexes import ensure_indexes, verify_indexes
+
+load_dotenv()
+
+
+def main():
+    try:
+        mongodb_uri = os.getenv("MONGODB_URI", "mongodb://localhost:27017/secret-santa")
+        client = MongoClient(mongodb_uri)
+        db = client.get_database()
+
+        print("✅ Connected to MongoDB")
+        print("\n🔧 Ensuring indexes...")
+
+        failures = ensure_indexes(db)
+        if failures:
+            for collection_name, index_name, error in failures:
+                print(f"❌ {collection_name}.{index_name}: {error}")
+        else:
+            print("✅ All indexes present")
+
+        print("\n🔍 Query plans:")
+        report = verify_indexes(db)
+        for entry in report:
+            status = "✅" if entry["indexed"] and not entry["inMemorySort"] else "⚠️ "
+            notes = []
+            if not entry["indexed"]:
+                notes.append("collection scan")
+            if entry["inMemorySort"]:
+                notes.append("in-memory sort")
+            detail = f" ({', '.join(notes)})" if notes else ""
+            print(f"   {status} {entry['query']}: {' > '.join(entry['stages'])}{detail}")
+
+        if failures or not all(entry["indexed"] for entry in report):
+            sys.exit(1)
+
+    except Exception as error:
+        print(f"❌ Fatal error: {error}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
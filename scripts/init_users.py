@@ -1,20 +1,26 @@
 """
 Script to initialize users in the database
-Run with: python scripts/init_users.py
+Run with: python scripts/init_users.py [--file users.csv|users.ndjson|-] [--format csv|ndjson]
+
+Without --file the built-in cousin list is created without secret keys.
+A CSV needs a header row with a name column and an optional secretKey
+column; NDJSON has one {"name": ..., "secretKey": ...} object per line.
+"-" reads from stdin. Rows are streamed, so large files are fine.
 
 Make sure to set MONGODB_URI in your .env file first
 """
 
 import os
 import sys
+import argparse
 from dotenv import load_dotenv
 from pymongo import MongoClient
-from bson import ObjectId
-import bcrypt
-from datetime import datetime, timezone
 
-# Add parent directory to path to import User model
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+# Add server directory to path to import the User model
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "server"))
+
+from services.crypto_pool import crypto_pool
+from services.user_import import import_users, read_rows
 
 load_dotenv()
 
@@ -28,53 +34,50 @@ CUZZYS = [
 ]
 
 
-def init_users():
+def open_rows(path, fmt):
+    """Rows from a CSV/NDJSON file (or stdin for "-"), format from the extension by default"""
+    if fmt is None:
+        fmt = "ndjson" if path.endswith((".ndjson", ".jsonl")) else "csv"
+    stream = sys.stdin if path == "-" else open(path, encoding="utf-8", newline="")
+    return read_rows(stream, fmt)
+
+
+def init_users(path=None, fmt=None, batch_size=1000, processes=None):
     try:
         # Connect to MongoDB
         mongodb_uri = os.getenv("MONGODB_URI", "mongodb://localhost:27017/secret-santa")
         client = MongoClient(mongodb_uri)
         db = client.get_database()
-        users_collection = db.users
 
         print("✅ Connected to MongoDB")
 
-        # Create users
-        created_users = []
-        errors = []
-
-        for cuzzy in CUZZYS:
-            try:
-                # Check if user already exists
-                existing = users_collection.find_one({"name": cuzzy["name"]})
-                if existing:
-                    print(f"⚠️  {cuzzy['name']} already exists, skipping...")
-                    errors.append({"name": cuzzy["name"], "error": "Already exists"})
-                    continue
-
-                # Create user without secret key (users will set it themselves)
-                user = {
-                    "name": cuzzy["name"],
-                    "secretKey": None,
-                    "assignedTo": None,
-                    "createdAt": datetime.now(timezone.utc),
-                }
-
-                result = users_collection.insert_one(user)
-                created_users.append({"name": cuzzy["name"], "id": str(result.inserted_id)})
-                print(f"✅ Created user: {cuzzy['name']}")
-            except Exception as error:
-                print(f"❌ Error creating {cuzzy['name']}: {error}")
-                errors.append({"name": cuzzy["name"], "error": str(error)})
+        crypto_pool.rounds = int(os.getenv("BCRYPT_ROUNDS", 12))
+        rows = open_rows(path, fmt) if path else CUZZYS
+
+        # Existing names are checked per batch with one query, keys are hashed
+        # across worker processes, and each batch is one insert_many. Running
+        # servers see the new users through the roster version bump.
+        result = import_users(
+            db,
+            rows,
+            batch_size=batch_size,
+            processes=processes if processes is not None else (os.cpu_count() or 1),
+        )
+        created_users, errors = result["created"], result["errors"]
+
+        for user in created_users:
+            print(f"✅ Created user: {user['name']}")
 
         print("\n📊 Summary:")
         print(f"✅ Created: {len(created_users)} users")
         if errors:
             print(f"⚠️  Errors: {len(errors)}")
             for e in errors:
-                print(f"   - {e['name']}: {e['error']}")
+                print(f"   - row {e['row']} {e['name']}: {e['error']}")
 
-        print("\n📝 Note: Users are created without secret keys.")
-        print("   Each user will need to set their secret key when they first log in.")
+        if not path:
+            print("\n📝 Note: Users are created without secret keys.")
+            print("   Each user will need to set their secret key when they first log in.")
 
     except Exception as error:
         print(f"❌ Fatal error: {error}")
@@ -82,5 +85,10 @@ def init_users():
 
 
 if __name__ == "__main__":
-    init_users()
-
+    parser = argparse.ArgumentParser(description="Create users")
+    parser.add_argument("--file", help="CSV or NDJSON file of users, or - for stdin")
+    parser.add_argument("--format", choices=["csv", "ndjson"], help="Input format (default: from the file extension)")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Rows per insert_many")
+    parser.add_argument("--processes", type=int, help="Hashing processes (default: CPU count, 0 for in-process)")
+    args = parser.parse_args()
+    init_users(args.file, args.format, args.batch_size, args.processes)
@@ -0,0 +1,66 @@
+"""
+Script to move assignments stored on user documents into an assignment generation
+Run with: python scripts/migrate_assignments.py
+
+Assignments used to live in each user's assignedTo/seenAssignment fields.
+They are now written as complete sets in the assignments collection and
+activated through a pointer in the meta collection. Run this once after
+deploying; it is a no-op when no user has an assignedTo field left.
+"""
+
+import os
+import sys
+from dotenv import load_dotenv
+from pymongo import MongoClient
+
+# Add server directory to path to import the Assignment model
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "server"))
+
+from models.assignment import Assignment
+from models.user import bump_roster_version
+
+load_dotenv()
+
+
+def migrate_assignments():
+    try:
+        mongodb_uri = os.getenv("MONGODB_URI", "mongodb://localhost:27017/secret-santa")
+        client = MongoClient(mongodb_uri)
+        db = client.get_database()
+        users_collection = db.users
+
+        print("✅ Connected to MongoDB")
+
+        users = list(users_collection.find(
+            {"assignedTo": {"$ne": None}}, {"assignedTo": 1, "seenAssignment": 1}
+        ))
+        if not users:
+            print("✅ No assignments on user documents; nothing to migrate")
+            return
+
+        print(f"\n🔄 Publishing {len(users)} assignment(s) as a new generation...")
+        generation = Assignment(db).publish(
+            [(user["_id"], user["assignedTo"]) for user in users]
+        )
+        if generation is None:
+            print("❌ A shuffle was published meanwhile; nothing migrated")
+            sys.exit(1)
+
+        seen_ids = [user["_id"] for user in users if user.get("seenAssignment")]
+        users_collection.update_many(
+            {"_id": {"$in": seen_ids}}, {"$set": {"seenGeneration": generation}}
+        )
+        users_collection.update_many(
+            {}, {"$unset": {"assignedTo": "", "seenAssignment": ""}}
+        )
+        bump_roster_version(db)
+
+        print(f"\n✅ Generation {generation} is active ({len(seen_ids)} already seen)")
+
+    except Exception as error:
+        print(f"❌ Fatal error: {error}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    migrate_assignments()
@@ -0,0 +1,88 @@
+"""
+Script to rebuild every user's inbox summary from the messages collection
+Run with: python scripts/rebuild_inbox_summaries.py
+
+Use it once for messages sent before summaries existed, or after deleting
+messages, ideally while no one is chatting. Last messages are recomputed;
+unread counts are kept for conversations that still have messages, since
+read state isn't stored anywhere else.
+"""
+
+import os
+import sys
+from dotenv import load_dotenv
+from pymongo import MongoClient, UpdateOne
+
+# Add server directory to path to import the inbox model
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "server"))
+
+from models.inbox import PREVIEW_LENGTH
+
+load_dotenv()
+
+
+def rebuild_inbox_summaries():
+    """Recompute lastMessage/updatedAt of every conversation, one aggregation"""
+    try:
+        mongodb_uri = os.getenv("MONGODB_URI", "mongodb://localhost:27017/secret-santa")
+        client = MongoClient(mongodb_uri)
+        db = client.get_database()
+
+        print("✅ Connected to MongoDB")
+
+        # Newest message per conversation, walking the conversation index
+        latest = db.messages.aggregate([
+            {"$sort": {"conversationId": 1, "createdAt": -1, "_id": -1}},
+            {"$group": {
+                "_id": "$conversationId",
+                "id": {"$first": "$_id"},
+                "senderId": {"$first": "$senderId"},
+                "receiverId": {"$first": "$receiverId"},
+                "message": {"$first": "$message"},
+                "createdAt": {"$first": "$createdAt"},
+            }},
+        ])
+
+        conversations = {}
+        for conversation in latest:
+            summary = {
+                "lastMessage": {
+                    "id": conversation["id"],
+                    "senderId": conversation["senderId"],
+                    "preview": conversation["message"][:PREVIEW_LENGTH],
+                    "createdAt": conversation["createdAt"],
+                },
+                "updatedAt": conversation["createdAt"],
+            }
+            for user_id in (conversation["senderId"], conversation["receiverId"]):
+                conversations.setdefault(user_id, {})[conversation["_id"]] = summary
+
+        existing = {
+            summary["_id"]: summary.get("conversations", {})
+            for summary in db.inbox_summaries.find({})
+        }
+        operations = []
+        for user_id, user_conversations in conversations.items():
+            for conversation_id, summary in user_conversations.items():
+                unread = existing.get(user_id, {}).get(conversation_id, {}).get("unread", 0)
+                user_conversations[conversation_id] = {**summary, "unread": unread}
+            operations.append(UpdateOne(
+                {"_id": user_id}, {"$set": {"conversations": user_conversations}}, upsert=True
+            ))
+
+        if operations:
+            db.inbox_summaries.bulk_write(operations, ordered=False)
+        # Users whose conversations are all gone
+        removed = db.inbox_summaries.delete_many({"_id": {"$nin": list(conversations)}})
+
+        print(f"\n✅ Rebuilt {len(operations)} inbox summar{'y' if len(operations) == 1 else 'ies'}")
+        if removed.deleted_count:
+            print(f"🗑️  Removed {removed.deleted_count} empty summar{'y' if removed.deleted_count == 1 else 'ies'}")
+
+    except Exception as error:
+        print(f"❌ Fatal error: {error}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    rebuild_inbox_summaries()
@@ -1,53 +1,49 @@
 """
 Script to shuffle assignments
-Run with: python scripts/shuffle.py
+Run with: python scripts/shuffle.py [--rules rules.json] [--avoid-previous]
+
+rules.json may list households whose members must not draw each other and
+explicit [giver, receiver] exclusions:
+    {"households": [["Rohan", "Isha"]], "exclusions": [["Vinny", "Charvi"]]}
 """
 
 import os
 import sys
-import random
+import json
+import argparse
 from dotenv import load_dotenv
 from pymongo import MongoClient
-from bson import ObjectId
+
+# Add server directory to path to import the shuffle engine
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "server"))
+
+from services.shuffle_engine import shuffle_assignments
 
 load_dotenv()
 
 
-def shuffle():
+def shuffle(rules):
     try:
         mongodb_uri = os.getenv("MONGODB_URI", "mongodb://localhost:27017/secret-santa")
         client = MongoClient(mongodb_uri)
         db = client.get_database()
-        users_collection = db.users
 
         print("✅ Connected to MongoDB")
 
-        users = list(users_collection.find({}))
-
-        if len(users) < 2:
+        user_count = db.users.count_documents({})
+        if user_count < 2:
             print("❌ Need at least 2 users to shuffle")
             sys.exit(1)
 
-        print(f"\n🎲 Shuffling {len(users)} users...")
+        print(f"\n🎲 Shuffling {user_count} users...")
 
-        # Randomize the order of users
-        shuffled = users.copy()
-        random.shuffle(shuffled)
+        # Written as a new generation with insert_many, then activated with one
+        # pointer write; running servers then distrust old token claims
+        assignments = shuffle_assignments(db, rules)
 
-        # Create circular assignment: each person assigns to the next,
-        # with the last person assigning back to the first
         print("\n✅ Assignments shuffled successfully!\n")
-        for i in range(len(shuffled)):
-            # Assign current person to the next person (circular)
-            next_index = (i + 1) % len(shuffled)
-            assigned_to = shuffled[next_index]
-            
-            users_collection.update_one(
-                {"_id": shuffled[i]["_id"]},
-                {"$set": {"assignedTo": assigned_to["_id"], "seenAssignment": False}},
-            )
-            
-            # print(f"   {shuffled[i]['name']} → {assigned_to['name']}")
+        # for assignment in assignments:
+        #     print(f"   {assignment['name']} → {assignment['assignedTo']}")
 
     except Exception as error:
         print(f"❌ Error: {error}")
@@ -55,5 +51,20 @@ def shuffle():
 
 
 if __name__ == "__main__":
-    shuffle()
+    parser = argparse.ArgumentParser(description="Shuffle Secret Santa assignments")
+    parser.add_argument("--rules", help="JSON file with households and exclusions")
+    parser.add_argument(
+        "--avoid-previous",
+        action="store_true",
+        help="don't let anyone draw the person they currently have",
+    )
+    args = parser.parse_args()
+
+    rules = {}
+    if args.rules:
+        with open(args.rules) as rules_file:
+            rules = json.load(rules_file)
+    if args.avoid_previous:
+        rules["avoidPrevious"] = True
 
+    shuffle(rules)
@@ -1,13 +1,20 @@
-from flask import Flask, jsonify, request, send_from_directory
+from flask import Flask, current_app, jsonify, request
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
 from dotenv import load_dotenv
 import os
-from pymongo import MongoClient
 from routes.auth import auth_bp
 from routes.assignments import assignments_bp
 from routes.admin import admin_bp
 from routes.messages import messages_bp
+from routes.dashboard import dashboard_bp
+from services.message_broker import create_broker
+from services.mongo import MongoConnection
+from services.static_assets import StaticAssets
+from models.user import roster_cache
+from models.generation import shuffle_generation
+from services.crypto_pool import crypto_pool
+from services.credential_cache import verified_keys
 
 load_dotenv()
 
@@ -15,105 +22,174 @@ load_dotenv()
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DIST_DIR = os.path.join(BASE_DIR, "dist")
 
-# Don't use static_url_path="" to avoid Flask's automatic static file serving
-# We'll handle static files manually in our routes
-app = Flask(__name__, static_folder=None)
-app.config["JWT_SECRET_KEY"] = os.getenv("JWT_SECRET", "secret-santa-key")
-app.config["JWT_ACCESS_TOKEN_EXPIRES"] = False  # 7 days handled in token creation
 
-CORS(app)
-jwt = JWTManager(app)
-
-# MongoDB connection
-mongodb_uri = os.getenv("MONGODB_URI", "mongodb://localhost:27017/secret-santa")
-db = None
-client = None
-
-try:
-    # Add connection options for better reliability with Atlas replica sets
-    client = MongoClient(
-        mongodb_uri,
+def create_app():
+    """Build the Flask app without touching the database
+
+    The MongoClient is created lazily in each process on its first request
+    (see services.mongo), so this is safe to call in a gunicorn --preload
+    parent and returns immediately even when MongoDB is unreachable.
+    """
+    # Don't use static_url_path="" to avoid Flask's automatic static file serving
+    # We'll handle static files manually in our routes
+    app = Flask(__name__, static_folder=None)
+    # Keys the secretKeyTag lookup HMAC (see models.user.lookup_tag); fail at
+    # startup rather than on the first login
+    if not os.getenv("SECRET_KEY_LOOKUP_KEY"):
+        raise RuntimeError("SECRET_KEY_LOOKUP_KEY must be set")
+    app.config["JWT_SECRET_KEY"] = os.getenv("JWT_SECRET", "secret-santa-key")
+    app.config["JWT_ACCESS_TOKEN_EXPIRES"] = False  # 7 days handled in token creation
+
+    CORS(app)
+    JWTManager(app)
+
+    # MongoDB connection, one pool per worker process. minPoolSize stays 0 by
+    # default so a fleet of fresh workers doesn't open connections all at once;
+    # waitQueueTimeoutMS bounds how long a request waits for a pooled socket.
+    # While the database is unreachable API requests get an immediate 503 and
+    # a background thread reconnects with exponential backoff.
+    mongo = MongoConnection(
+        os.getenv("MONGODB_URI", "mongodb://localhost:27017/secret-santa"),
+        reconnect_base_delay=float(os.getenv("MONGO_RECONNECT_BASE_SECONDS", 0.5)),
+        reconnect_max_delay=float(os.getenv("MONGO_RECONNECT_MAX_SECONDS", 30)),
+        maxPoolSize=int(os.getenv("MONGO_MAX_POOL_SIZE", 20)),
+        minPoolSize=int(os.getenv("MONGO_MIN_POOL_SIZE", 0)),
+        waitQueueTimeoutMS=int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", 2000)),
         serverSelectionTimeoutMS=5000,  # 5 second timeout for server selection
         connectTimeoutMS=10000,  # 10 second timeout for initial connection
         socketTimeoutMS=45000,  # 45 second timeout for socket operations
         retryWrites=True,
         retryReads=True,
     )
-    # Test the connection by pinging the server
-    client.admin.command('ping')
-    db = client.get_database()
-    print("✅ Connected to MongoDB")
-except Exception as error:
-    print(f"❌ MongoDB connection error: {error}")
-    db = None
-    client = None
-
-# Make db available to routes
-app.config["MONGO_DB"] = db
-app.config["MONGO_CLIENT"] = client
-
-# Register blueprints
-app.register_blueprint(auth_bp, url_prefix="/api/auth")
-app.register_blueprint(assignments_bp, url_prefix="/api/assignments")
-app.register_blueprint(admin_bp, url_prefix="/api/admin")
-app.register_blueprint(messages_bp, url_prefix="/api/messages")
-
-
-@app.route("/api/health")
+    # Makes app.config["MONGO_DB"] available to routes
+    mongo.init_app(app)
+
+    # Pushes new messages to /api/messages/stream subscribers.
+    # "memory" works for a single process; use "changestream" when running several workers
+    app.config["MESSAGE_BROKER"] = create_broker(os.getenv("MESSAGE_BROKER", "memory"), mongo)
+    app.config["STREAM_KEEPALIVE_SECONDS"] = int(os.getenv("STREAM_KEEPALIVE_SECONDS", 15))
+    app.config["STREAM_MAX_SECONDS"] = int(os.getenv("STREAM_MAX_SECONDS", 300))
+    # "auto" only streams on threaded workers (a sync worker would be pinned by one
+    # stream), "on" also streams on async workers, "off" leaves clients polling
+    app.config["STREAMING"] = os.getenv("STREAMING", "auto")
+    # Request threads per worker (see gunicorn.conf.py). Streams and bcrypt
+    # waiters each hold one, so both are capped below it
+    threads = int(os.getenv("GUNICORN_THREADS", 32))
+    app.config["STREAM_MAX_SUBSCRIBERS"] = int(
+        os.getenv("STREAM_MAX_SUBSCRIBERS", max(1, threads // 2))
+    )
+
+    # Roster cache: how often to check the roster version, and the hard reload age
+    # (set ROSTER_CACHE_MAX_AGE_SECONDS=0 to disable caching)
+    roster_cache.check_interval = float(os.getenv("ROSTER_CACHE_CHECK_SECONDS", 1))
+    roster_cache.max_age = float(os.getenv("ROSTER_CACHE_MAX_AGE_SECONDS", 60))
+    # Assignment claims in tokens are trusted while their shuffle generation is current
+    shuffle_generation.check_interval = roster_cache.check_interval
+
+    # bcrypt runs on a bounded pool; requests beyond workers + queue get 503 + Retry-After.
+    # Every slot blocks a request thread, so by default a login rush holds at
+    # most a quarter of them
+    crypto_workers = int(os.getenv("CRYPTO_POOL_WORKERS", 2))
+    crypto_pool.configure(
+        workers=crypto_workers,
+        max_queue=int(os.getenv("CRYPTO_POOL_QUEUE", max(0, threads // 4 - crypto_workers))),
+    )
+    busy_threads = crypto_pool.workers + crypto_pool.max_queue + app.config["STREAM_MAX_SUBSCRIBERS"]
+    if busy_threads >= threads:
+        print(
+            f"⚠️  Crypto pool slots plus STREAM_MAX_SUBSCRIBERS ({busy_threads}) can hold all "
+            f"{threads} GUNICORN_THREADS; polling may starve under load"
+        )
+    crypto_pool.retry_after = int(os.getenv("CRYPTO_RETRY_AFTER_SECONDS", 1))
+    # bcrypt cost for new hashes; pick it with scripts/calibrate_bcrypt.py.
+    # Logins transparently rehash keys stored with a different cost
+    crypto_pool.rounds = int(os.getenv("BCRYPT_ROUNDS", 12))
+
+    # How long a successful key check is remembered (0 disables the cache)
+    verified_keys.ttl = float(os.getenv("VERIFIED_KEY_TTL_SECONDS", 30))
+
+    # Bulk user imports: rows per batch, and worker processes for hashing the keys
+    # they carry. The default 0 hashes on the bounded crypto pool above, so an
+    # import can't fork a process per CPU on the web host (each child would
+    # re-import the app); scripts/init_users.py uses every CPU instead
+    app.config["IMPORT_BATCH_SIZE"] = int(os.getenv("IMPORT_BATCH_SIZE", 1000))
+    app.config["IMPORT_HASH_PROCESSES"] = int(os.getenv("IMPORT_HASH_PROCESSES", 0))
+
+    # Register blueprints
+    app.register_blueprint(auth_bp, url_prefix="/api/auth")
+    app.register_blueprint(assignments_bp, url_prefix="/api/assignments")
+    app.register_blueprint(admin_bp, url_prefix="/api/admin")
+    app.register_blueprint(messages_bp, url_prefix="/api/messages")
+    app.register_blueprint(dashboard_bp, url_prefix="/api/dashboard")
+
+    # dist/ is indexed once; restart after rebuilding the frontend
+    app.extensions["static_assets"] = StaticAssets(
+        DIST_DIR,
+        max_file_bytes=int(os.getenv("STATIC_CACHE_MAX_FILE_BYTES", 2 * 1024 * 1024)),
+    ).load()
+
+    app.add_url_rule("/api/health", view_func=health)
+    # Serve React app in production
+    # This catch-all route must be registered last to allow API routes to be handled first
+    app.add_url_rule("/", defaults={"path": ""}, view_func=serve)
+    app.add_url_rule("/<path:path>", view_func=serve)
+    # 404 error handler as backup - catches any 404s that slip through
+    app.register_error_handler(404, handle_404)
+
+    return app
+
+
 def health():
+    mongo = current_app.extensions["mongo"]
+    db = mongo.db
+    if mongo.breaker.is_open:
+        # Known to be down: answer without waiting on the driver
+        return jsonify({
+            "status": "ok", 
+            "message": "Server is running",
+            "mongodb": "disconnected",
+            "circuit": mongo.breaker.status(),
+        }), 503
     try:
-        if db is not None:
-            # Test the connection
-            db.command('ping')
-            return jsonify({
-                "status": "ok", 
-                "message": "Server is running",
-                "mongodb": "connected"
-            })
-        else:
-            return jsonify({
-                "status": "ok", 
-                "message": "Server is running",
-                "mongodb": "disconnected"
-            }), 503
+        # Test the connection
+        db.command('ping')
+        return jsonify({
+            "status": "ok", 
+            "message": "Server is running",
+            "mongodb": "connected",
+            "circuit": mongo.breaker.status(),
+        })
     except Exception as e:
         return jsonify({
             "status": "ok", 
             "message": "Server is running",
             "mongodb": "error",
-            "error": str(e)
+            "error": str(e),
+            "circuit": mongo.breaker.status(),
         }), 503
 
 
-# Serve React app in production
-# This catch-all route must be registered last to allow API routes to be handled first
-@app.route("/", defaults={"path": ""})
-@app.route("/<path:path>")
+def serve_spa(path):
+    """Serve a built file from the in-memory asset index, or index.html so
+    React Router can handle client-side routes (/key, /login, ...)"""
+    assets = current_app.extensions["static_assets"]
+    asset = assets.get(path) if path else None
+    if asset is None:
+        asset = assets.index
+    if asset is None:
+        # Fallback if dist folder doesn't exist (shouldn't happen in production)
+        return jsonify({"error": "Frontend not built. Please run 'npm run build'"}), 500
+    return asset.response()
+
+
 def serve(path):
     """Catch-all route to serve SPA - handles both static files and client-side routes"""
     # Exclude API routes - they should be handled by blueprints above
     if path.startswith("api/"):
         return jsonify({"error": "Not found"}), 404
-    
-    # Check if the path is a static file (e.g., CSS, JS, images from Vite build)
-    if path != "" and not path.startswith("api/"):
-        static_path = os.path.join(DIST_DIR, path)
-        # Check if it's a file that exists
-        if os.path.exists(static_path) and os.path.isfile(static_path):
-            return send_from_directory(DIST_DIR, path)
-    
-    # For all other routes (including nested routes like /key, /login, etc.), serve index.html
-    # This allows React Router to handle client-side routing
-    index_path = os.path.join(DIST_DIR, "index.html")
-    if os.path.exists(index_path):
-        return send_from_directory(DIST_DIR, "index.html")
-    else:
-        # Fallback if dist folder doesn't exist (shouldn't happen in production)
-        return jsonify({"error": "Frontend not built. Please run 'npm run build'"}), 500
+    return serve_spa(path)
 
 
-# 404 error handler as backup - catches any 404s that slip through
-@app.errorhandler(404)
 def handle_404(error):
     """Handle 404 errors by serving index.html for SPA routing"""
     path = request.path
@@ -121,22 +197,11 @@ def handle_404(error):
     # Exclude API routes - they should return 404 if not found
     if path.startswith("/api/"):
         return jsonify({"error": "Not found"}), 404
-    
-    # Check if the path is a static file
-    if path != "/" and not path.startswith("/api/"):
-        static_path = os.path.join(DIST_DIR, path.lstrip("/"))
-        if os.path.exists(static_path) and os.path.isfile(static_path):
-            return send_from_directory(DIST_DIR, path.lstrip("/"))
-    
-    # Serve index.html for all other routes
-    index_path = os.path.join(DIST_DIR, "index.html")
-    if os.path.exists(index_path):
-        return send_from_directory(DIST_DIR, "index.html")
-    else:
-        return jsonify({"error": "Frontend not built. Please run 'npm run build'"}), 500
+    return serve_spa(path.lstrip("/"))
 
 
 if __name__ == "__main__":
     port = int(os.getenv("PORT", 5000))
+    app = create_app()
     app.run(host="0.0.0.0", port=port, debug=True)
 
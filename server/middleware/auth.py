@@ -1,6 +1,9 @@
 from functools import wraps
 from flask import jsonify
-from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity
+from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity, get_jwt
+from models.generation import shuffle_generation
+from models.assignment import Assignment
+from models.user import PUBLIC_FIELDS
 
 
 def auth_required(f):
@@ -15,3 +18,43 @@ def auth_required(f):
     
     return decorated_function
 
+
+def assignment_claims(user_model, user):
+    """JWT claims describing the user's assignment in the active shuffle generation"""
+    assignment = Assignment(user_model.db)
+    # Both ids come from the same immutable generation, so they are always consistent
+    generation = assignment.active_generation()
+    user_id = str(user["_id"])
+    return {
+        "assignedTo": assignment.get_receiver_id(user_id, generation),
+        "santa": assignment.get_giver_id(user_id, generation),
+        "generation": generation,
+    }
+
+
+def has_current_assignment_claims(db):
+    """True if the token's assignment claims were issued in the current shuffle generation"""
+    generation = get_jwt().get("generation")
+    return generation is not None and generation == shuffle_generation.current(db)
+
+
+def current_assignment(user_model):
+    """(assignedToId, santaId) for the current user, or None if the user doesn't exist
+
+    Uses the token's claims while they match the current shuffle generation,
+    so the hot paths skip looking the caller up; otherwise reads the database.
+    """
+    if has_current_assignment_claims(user_model.db):
+        claims = get_jwt()
+        return claims.get("assignedTo"), claims.get("santa")
+
+    user_id = get_jwt_identity()
+    user = user_model.find_by_id(user_id, fields=PUBLIC_FIELDS)
+    if not user:
+        return None
+    assignment = Assignment(user_model.db)
+    generation = assignment.active_generation()
+    return (
+        assignment.get_receiver_id(user_id, generation),
+        assignment.get_giver_id(user_id, generation),
+    )
@@ -0,0 +1,102 @@
+from bson import ObjectId
+from datetime import datetime, timezone
+import threading
+from models.generation import shuffle_generation
+
+
+class AssignmentSetCache:
+    """Process-wide cache of published assignment sets, keyed by generation
+
+    A set is never modified after it is activated, so entries don't need
+    invalidation; only the newest max_sets generations are kept.
+    """
+
+    def __init__(self, max_sets=2):
+        self.max_sets = max_sets
+        self._lock = threading.Lock()
+        self._sets = {}
+
+    def get(self, db, generation):
+        """{"receiver_of": {giver: receiver}, "giver_of": {receiver: giver}} as string ids"""
+        with self._lock:
+            cached = self._sets.get(generation)
+            if cached is not None:
+                return cached
+            docs = db.assignments.find(
+                {"generation": generation}, {"_id": 0, "giverId": 1, "receiverId": 1}
+            )
+            receiver_of = {str(doc["giverId"]): str(doc["receiverId"]) for doc in docs}
+            assignment_set = {
+                "receiver_of": receiver_of,
+                "giver_of": {receiver: giver for giver, receiver in receiver_of.items()},
+            }
+            self._sets[generation] = assignment_set
+            for old in sorted(self._sets)[:-self.max_sets]:
+                del self._sets[old]
+            return assignment_set
+
+
+assignment_sets = AssignmentSetCache()
+
+
+class Assignment:
+    def __init__(self, db):
+        self.db = db
+        self.collection = db.assignments
+
+    def active_generation(self):
+        """Generation number of the active assignment set"""
+        return shuffle_generation.current(self.db)
+
+    def active_set(self, generation=None):
+        """Maps for the active (or given) generation's assignment set"""
+        if generation is None:
+            generation = self.active_generation()
+        return assignment_sets.get(self.db, generation)
+
+    def get_receiver_id(self, giver_id, generation=None):
+        """Id of the user giver_id is buying for, or None"""
+        return self.active_set(generation)["receiver_of"].get(str(giver_id))
+
+    def get_giver_id(self, receiver_id, generation=None):
+        """Id of receiver_id's Secret Santa, or None"""
+        return self.active_set(generation)["giver_of"].get(str(receiver_id))
+
+    def publish(self, pairs):
+        """Write a complete assignment set as a new generation, then activate it
+
+        pairs is a list of (giver_id, receiver_id); an empty list clears all
+        assignments. Readers keep seeing the previous set until the single
+        pointer write at the end. Returns the new generation number, or None
+        if an overlapping shuffle activated a newer generation first.
+        """
+        generation = shuffle_generation.allocate(self.db)
+        if pairs:
+            created_at = datetime.now(timezone.utc)
+            self.collection.insert_many(
+                [
+                    {
+                        "generation": generation,
+                        "giverId": ObjectId(giver_id),
+                        "receiverId": ObjectId(receiver_id),
+                        "createdAt": created_at,
+                    }
+                    for giver_id, receiver_id in pairs
+                ],
+                ordered=False,
+            )
+
+        previous = shuffle_generation.activate(self.db, generation)
+        if previous is None:
+            # Superseded: this set was never active, and the newer one stays
+            self.collection.delete_many({"generation": generation})
+            return None
+
+        # Keep the previous set for requests that resolved it just before the flip
+        # (previous < generation, so the active set is never removed)
+        self.collection.delete_many({"generation": {"$lt": previous}})
+        return generation
+
+    def clear(self):
+        """Activate an empty assignment set"""
+        return self.publish([])
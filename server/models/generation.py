@@ -0,0 +1,79 @@
+import threading
+import time
+from pymongo import ReturnDocument
+
+SHUFFLE_GENERATION_ID = "shuffle"
+
+
+class ShuffleGeneration:
+    """Cached pointer to the active assignment generation
+
+    Each shuffle writes a complete assignment set under a new generation
+    number and then activates it with a single write to the meta collection,
+    so readers see either the old set or the new one, never a mix. Tokens
+    carry the generation they were issued in; routes trust their assignment
+    claims only while it is still active. The pointer is re-read at most
+    every check_interval seconds per process.
+    """
+
+    def __init__(self, check_interval=1.0):
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._generation = None
+        self._checked_at = 0.0
+
+    def current(self, db):
+        """The active generation (0 before any assignment set was published)"""
+        now = time.monotonic()
+        with self._lock:
+            if self._generation is None or now - self._checked_at >= self.check_interval:
+                meta = db.meta.find_one({"_id": SHUFFLE_GENERATION_ID})
+                self._generation = meta.get("generation", 0) if meta else 0
+                self._checked_at = now
+            return self._generation
+
+    def allocate(self, db):
+        """Reserve a new generation number, above any active or allocated one"""
+        meta = db.meta.find_one({"_id": SHUFFLE_GENERATION_ID}) or {}
+        db.meta.update_one(
+            {"_id": SHUFFLE_GENERATION_ID},
+            {"$max": {"latest": meta.get("generation", 0)}},
+            upsert=True,
+        )
+        meta = db.meta.find_one_and_update(
+            {"_id": SHUFFLE_GENERATION_ID},
+            {"$inc": {"latest": 1}},
+            return_document=ReturnDocument.AFTER,
+        )
+        return meta["latest"]
+
+    def activate(self, db, generation):
+        """Make a fully written generation the active one (a single write)
+
+        The write only applies while the active generation is older, so a
+        shuffle that overlaps a newer one can't roll the pointer back.
+        Returns the generation that was active before, or None if a newer
+        one is already active.
+        """
+        meta = db.meta.find_one_and_update(
+            {
+                "_id": SHUFFLE_GENERATION_ID,
+                "$or": [
+                    {"generation": {"$lt": generation}},
+                    {"generation": {"$exists": False}},
+                ],
+            },
+            {"$set": {"generation": generation}},
+            return_document=ReturnDocument.BEFORE,
+        )
+        with self._lock:
+            if meta is None:
+                # Re-read the newer pointer on the next current() call
+                self._generation = None
+                return None
+            self._generation = generation
+            self._checked_at = time.monotonic()
+        return meta.get("generation", 0)
+
+
+shuffle_generation = ShuffleGeneration()
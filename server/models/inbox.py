@@ -0,0 +1,64 @@
+from pymongo import UpdateOne
+from bson import ObjectId
+
+PREVIEW_LENGTH = 100
+
+
+class InboxSummary:
+    """Small per-user document summarizing each of the user's conversations
+
+    {_id: userId, conversations: {<conversationId>: {unread, lastMessage, updatedAt}}}
+
+    Kept up to date by Message.create with atomic $inc/$set upserts, so
+    clients can check for anything new by reading one tiny document instead
+    of fetching conversations.
+    """
+
+    def __init__(self, db):
+        self.collection = db.inbox_summaries
+
+    def record(self, message):
+        """Account for a newly written message in both participants' summaries"""
+        conversation = f"conversations.{message['conversationId']}"
+        last_message = {
+            "id": message["_id"],
+            "senderId": message["senderId"],
+            "preview": message["message"][:PREVIEW_LENGTH],
+            "createdAt": message["createdAt"],
+        }
+        latest = {
+            f"{conversation}.lastMessage": last_message,
+            f"{conversation}.updatedAt": message["createdAt"],
+        }
+        self.collection.bulk_write(
+            [
+                UpdateOne(
+                    {"_id": message["receiverId"]},
+                    {"$inc": {f"{conversation}.unread": 1}, "$set": latest},
+                    upsert=True,
+                ),
+                UpdateOne({"_id": message["senderId"]}, {"$set": latest}, upsert=True),
+            ],
+            ordered=False,
+        )
+
+    def get(self, user_id):
+        """The user's {conversationId: summary} map (empty if they have no messages)"""
+        summary = self.collection.find_one({"_id": ObjectId(user_id)})
+        return summary.get("conversations", {}) if summary else {}
+
+    def mark_read(self, user_id, conversation_ids):
+        """Reset the unread counts of the given conversations"""
+        if not conversation_ids:
+            return
+        self.collection.update_one(
+            {"_id": ObjectId(user_id)},
+            {"$set": {
+                f"conversations.{conversation}.unread": 0
+                for conversation in conversation_ids
+            }},
+        )
+
+    def clear(self):
+        """Drop every summary (after all messages were deleted)"""
+        self.collection.delete_many({})
@@ -0,0 +1,109 @@
+from pymongo import ASCENDING
+from pymongo.errors import PyMongoError
+from bson import ObjectId
+from models.message import conversation_id
+
+# Indexes backing every query the models run, keyed by collection name
+INDEXES = {
+    "users": [
+        {"keys": [("name", ASCENDING)], "name": "name_unique", "unique": True},
+        {"keys": [("secretKeyTag", ASCENDING)], "name": "secretKeyTag", "sparse": True},
+    ],
+    "assignments": [
+        {
+            "keys": [("generation", ASCENDING), ("giverId", ASCENDING)],
+            "name": "generation_giver",
+            "unique": True,
+        },
+    ],
+    "messages": [
+        {
+            "keys": [
+                ("conversationId", ASCENDING),
+                ("createdAt", ASCENDING),
+                ("_id", ASCENDING),
+            ],
+            "name": "conversation_createdAt",
+        },
+        {
+            "keys": [("senderId", ASCENDING), ("createdAt", ASCENDING)],
+            "name": "sender_createdAt",
+        },
+        {
+            "keys": [("receiverId", ASCENDING), ("createdAt", ASCENDING)],
+            "name": "receiver_createdAt",
+        },
+    ],
+}
+
+
+def _sample_queries():
+    """Representative model queries as (label, collection, filter, sort)"""
+    user1, user2 = ObjectId(), ObjectId()
+    return [
+        ("User.find_by_name", "users", {"name": "sample"}, None),
+        ("Assignment.active_set", "assignments", {"generation": 1}, None),
+        ("User.find_by_secret_key", "users", {"secretKeyTag": "sample"}, None),
+        (
+            "Message.get_conversation",
+            "messages",
+            {"conversationId": conversation_id(user1, user2)},
+            [("createdAt", ASCENDING), ("_id", ASCENDING)],
+        ),
+        (
+            "Message.get_messages_sent_to",
+            "messages",
+            {"receiverId": user1},
+            [("createdAt", ASCENDING)],
+        ),
+        (
+            "Message.get_messages_sent_by",
+            "messages",
+            {"senderId": user1},
+            [("createdAt", ASCENDING)],
+        ),
+    ]
+
+
+def ensure_indexes(db):
+    """Create any missing indexes; returns a list of (collection, index, error) failures"""
+    failures = []
+    for collection_name, specs in INDEXES.items():
+        collection = db[collection_name]
+        for spec in specs:
+            options = {key: value for key, value in spec.items() if key != "keys"}
+            try:
+                collection.create_index(spec["keys"], **options)
+            except PyMongoError as error:
+                # e.g. duplicate names already in the data block the unique index
+                failures.append((collection_name, spec["name"], str(error)))
+    return failures
+
+
+def _plan_stages(plan):
+    stages = [plan.get("stage")]
+    for child_key in ("inputStage", "queryPlan"):
+        if child_key in plan:
+            stages.extend(_plan_stages(plan[child_key]))
+    for child in plan.get("inputStages", []):
+        stages.extend(_plan_stages(child))
+    return stages
+
+
+def verify_indexes(db):
+    """Explain each model query and report whether it is served by an index"""
+    report = []
+    for label, collection_name, query, sort in _sample_queries():
+        cursor = db[collection_name].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        explain = cursor.explain()
+        stages = _plan_stages(explain["queryPlanner"]["winningPlan"])
+        report.append({
+            "query": label,
+            "stages": stages,
+            "indexed": "COLLSCAN" not in stages,
+            # A SORT stage means the results were sorted in memory
+            "inMemorySort": "SORT" in stages,
+        })
+    return report
@@ -1,58 +1,160 @@
 from pymongo import MongoClient
 from bson import ObjectId
-from datetime import datetime, timezone
+from datetime import datetime, timezone, timedelta
+from models.inbox import InboxSummary
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+# Fields the conversation endpoints return
+CONVERSATION_FIELDS = {"senderId": 1, "receiverId": 1, "message": 1, "createdAt": 1}
+
+
+def encode_cursor(message):
+    """Encode a message's (createdAt, _id) sort key as an opaque cursor string"""
+    created_at = message["createdAt"]
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    # Mongo stores datetimes with millisecond precision, so truncate to match
+    millis = (created_at - EPOCH) // timedelta(milliseconds=1)
+    return f"{millis}_{message['_id']}"
+
+
+def decode_cursor(cursor):
+    """Decode a cursor string back into (createdAt, ObjectId); raises ValueError if malformed"""
+    try:
+        millis, message_id = cursor.split("_", 1)
+        return EPOCH + timedelta(milliseconds=int(millis)), ObjectId(message_id)
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+
+def cursor_range(cursor, op):
+    """Filter for messages strictly after ($gt) or before ($lt) a cursor in (createdAt, _id) order"""
+    created_at, message_id = decode_cursor(cursor)
+    return {
+        "$or": [
+            {"createdAt": {op: created_at}},
+            {"createdAt": created_at, "_id": {op: message_id}},
+        ]
+    }
+
+
+def conversation_id(user1_id, user2_id):
+    """Canonical id shared by both directions of a conversation (sorted user-id pair)"""
+    return "_".join(sorted([str(user1_id), str(user2_id)]))
 
 
 class Message:
     def __init__(self, db):
         self.collection = db.messages
+        self.inbox = InboxSummary(db)
 
     def create(self, sender_id, receiver_id, message):
-        """Create a new message"""
+        """Create a new message and count it in both users' inbox summaries"""
         message_doc = {
             "senderId": ObjectId(sender_id),
             "receiverId": ObjectId(receiver_id),
+            "conversationId": conversation_id(sender_id, receiver_id),
             "message": message,
             "createdAt": datetime.now(timezone.utc),
         }
         result = self.collection.insert_one(message_doc)
         message_doc["_id"] = result.inserted_id
+        self.inbox.record(message_doc)
         return message_doc
 
-    def get_conversation(self, user1_id, user2_id):
-        """Get all messages between two users"""
-        messages = list(
-            self.collection.find(
-                {
-                    # this $or query is supposedly pretty efficient
-                    "$or": [
-                        {
-                            "senderId": ObjectId(user1_id),
-                            "receiverId": ObjectId(user2_id),
-                        },
-                        {
-                            "senderId": ObjectId(user2_id),
-                            "receiverId": ObjectId(user1_id),
-                        },
-                    ]
-                }
-            ).sort("createdAt", 1)
+    def get_conversation(self, user1_id, user2_id, since=None, before=None, limit=None,
+                         fields=CONVERSATION_FIELDS):
+        """Get messages between two users in chronological order
+
+        since: only messages after this cursor (used when polling for new ones)
+        before: only messages before this cursor (used when loading older pages)
+        limit: maximum number of messages; without since, the newest ones are returned
+        fields: fields to load (createdAt and _id are needed for cursors)
+        """
+        # Single range scan on the (conversationId, createdAt, _id) index
+        query = {"conversationId": conversation_id(user1_id, user2_id)}
+        ranges = []
+        if since:
+            ranges.append(cursor_range(since, "$gt"))
+        if before:
+            ranges.append(cursor_range(before, "$lt"))
+        if ranges:
+            query["$and"] = ranges
+
+        # Pages are read newest-first from the index, then returned oldest-first
+        newest_first = limit is not None and not since
+        direction = -1 if newest_first else 1
+        cursor = self.collection.find(query, fields).sort(
+            [("createdAt", direction), ("_id", direction)]
         )
+        if limit is not None:
+            cursor = cursor.limit(limit)
+
+        messages = list(cursor)
+        if newest_first:
+            messages.reverse()
         return messages
 
-    def get_messages_sent_to(self, receiver_id):
+    def get_conversation_heads(self, user_id, other_ids, limit, fields=CONVERSATION_FIELDS):
+        """Newest `limit` messages of several of a user's conversations at once
+
+        One aggregation: each conversation is its own indexed range scan on
+        (conversationId, createdAt, _id), chained with $unionWith. Returns
+        {other_id: messages oldest-first}, like get_conversation with a limit.
+        """
+        conversation_ids = {
+            other_id: conversation_id(user_id, other_id) for other_id in other_ids if other_id
+        }
+        if not conversation_ids:
+            return {}
+
+        def head(conversation):
+            return [
+                {"$match": {"conversationId": conversation}},
+                {"$sort": {"createdAt": -1, "_id": -1}},
+                {"$limit": limit},
+                {"$project": {**fields, "conversationId": 1}},
+            ]
+
+        first, *rest = sorted(set(conversation_ids.values()))
+        pipeline = head(first) + [
+            {"$unionWith": {"coll": self.collection.name, "pipeline": head(conversation)}}
+            for conversation in rest
+        ]
+        by_conversation = {}
+        for message in self.collection.aggregate(pipeline):
+            by_conversation.setdefault(message.pop("conversationId"), []).append(message)
+        return {
+            other_id: list(reversed(by_conversation.get(conversation, [])))
+            for other_id, conversation in conversation_ids.items()
+        }
+
+    def latest_message_id(self, user1_id, user2_id):
+        """_id of the newest message between two users, or None
+
+        Answered from the (conversationId, createdAt, _id) index alone.
+        """
+        latest = self.collection.find_one(
+            {"conversationId": conversation_id(user1_id, user2_id)},
+            {"_id": 1},
+            sort=[("createdAt", -1), ("_id", -1)],
+        )
+        return latest["_id"] if latest else None
+
+    def get_messages_sent_to(self, receiver_id, fields=CONVERSATION_FIELDS):
         """Get all messages sent to a user"""
         messages = list(
-            self.collection.find({"receiverId": ObjectId(receiver_id)}).sort(
+            self.collection.find({"receiverId": ObjectId(receiver_id)}, fields).sort(
                 "createdAt", 1
             )
         )
         return messages
 
-    def get_messages_sent_by(self, sender_id):
+    def get_messages_sent_by(self, sender_id, fields=CONVERSATION_FIELDS):
         """Get all messages sent by a user"""
         messages = list(
-            self.collection.find({"senderId": ObjectId(sender_id)}).sort(
+            self.collection.find({"senderId": ObjectId(sender_id)}, fields).sort(
                 "createdAt", 1
             )
         )
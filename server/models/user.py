@@ -1,101 +1,390 @@
 from pymongo import MongoClient
+from pymongo.errors import BulkWriteError
 from bson import ObjectId
-import bcrypt
+from flask import g, has_app_context
+from services.crypto_pool import crypto_pool
+from services.credential_cache import verified_keys
+from models.assignment import Assignment
+import hashlib
+import hmac
+import os
+import threading
+import time
 from datetime import datetime, timezone
 
+ROSTER_VERSION_ID = "roster"
+
+# Field sets for projected reads (_id is always included). Pass the smallest
+# one a caller needs: hashes only leave Mongo for code that checks them.
+PUBLIC_FIELDS = ("name",)
+PROFILE_FIELDS = ("name", "seenGeneration")
+CREDENTIAL_FIELDS = ("name", "secretKey", "secretKeyTag")
+# What the roster cache holds; reads needing other fields go to Mongo
+ROSTER_FIELDS = PROFILE_FIELDS
+
+
+def projection(fields):
+    """Mongo projection for a field set; None means the whole document"""
+    if fields is None:
+        return None
+    return {field: 1 for field in fields}
+
+
+def lookup_tag(secret_key):
+    """Server-keyed HMAC of a secret key, stored next to the bcrypt hash so a
+    user can be found by key with one indexed lookup instead of bcrypt-scanning"""
+    # Read at call time: the app loads .env after the models are imported.
+    # A dedicated key, so rotating JWT_SECRET doesn't orphan every stored tag
+    server_key = os.getenv("SECRET_KEY_LOOKUP_KEY")
+    if not server_key:
+        raise RuntimeError("SECRET_KEY_LOOKUP_KEY must be set")
+    return hmac.new(
+        server_key.encode("utf-8"), secret_key.encode("utf-8"), hashlib.sha256
+    ).hexdigest()
+
+
+def bump_roster_version(db):
+    """Record a users write so every process's RosterCache reloads"""
+    db.meta.update_one({"_id": ROSTER_VERSION_ID}, {"$inc": {"version": 1}}, upsert=True)
+    roster_cache.invalidate()
+
+
+class RosterCache:
+    """Process-wide snapshot of the users collection
+
+    The roster is small and only changes through admin actions and set-key, so
+    lookups are answered from memory. Every check_interval seconds the cache
+    compares its version with the one bump_roster_version() increments in the
+    meta collection, and it reloads unconditionally after max_age seconds to
+    pick up writes made outside the models. max_age <= 0 disables the cache.
+    Only ROSTER_FIELDS are loaded, so no secret key hashes are kept in memory.
+    Returned documents are shared between threads and must not be mutated.
+    """
+
+    def __init__(self, check_interval=1.0, max_age=60.0):
+        self.check_interval = check_interval
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._version = None
+        self._loaded_at = 0.0
+        self._checked_at = 0.0
+
+    @property
+    def enabled(self):
+        return self.max_age > 0
+
+    def snapshot(self, db):
+        """Return {"by_id", "by_name"} maps and their "version", reloading if stale"""
+        now = time.monotonic()
+        with self._lock:
+            if self._snapshot is not None:
+                if now - self._checked_at < self.check_interval:
+                    return self._snapshot
+                if now - self._loaded_at < self.max_age:
+                    if self._read_version(db) == self._version:
+                        self._checked_at = now
+                        return self._snapshot
+            self._load(db, now)
+            return self._snapshot
+
+    def invalidate(self):
+        with self._lock:
+            self._snapshot = None
+
+    def _read_version(self, db):
+        meta = db.meta.find_one({"_id": ROSTER_VERSION_ID})
+        return meta.get("version", 0) if meta else 0
+
+    def _load(self, db, now):
+        # Read the version first so a write racing with the load triggers another reload
+        version = self._read_version(db)
+        users = list(db.users.find({}, projection(ROSTER_FIELDS)))
+        self._snapshot = {
+            "by_id": {str(user["_id"]): user for user in users},
+            "by_name": {user["name"]: user for user in users},
+            "version": version,
+        }
+        self._version = version
+        self._loaded_at = now
+        self._checked_at = now
+
+
+roster_cache = RosterCache()
+
+
+def _identity_map():
+    """Per-request cache of user lookups (None outside a Flask request)
+
+    Keys are ("id", user_id, fields) and ("name", name, fields); missing users are cached as
+    None so repeated misses don't hit Mongo either.
+    """
+    if not has_app_context():
+        return None
+    if "user_identity_map" not in g:
+        g.user_identity_map = {}
+    return g.user_identity_map
+
 
 class User:
     def __init__(self, db):
+        self.db = db
         self.collection = db.users
 
-    def create(self, name, secret_key=None):
-        """Create a new user with optional secret key"""
+    def _roster(self, fresh, fields=ROSTER_FIELDS):
+        """Roster snapshot to answer from, or None to query Mongo"""
+        if fresh or not roster_cache.enabled:
+            return None
+        if fields is None or not set(fields) <= set(ROSTER_FIELDS):
+            return None
+        return roster_cache.snapshot(self.db)
+
+    def _cached(self, key, load):
+        """Return the identity-map entry for key, loading it once per request
+
+        Keys end with the field set loaded, so a projected document never
+        answers a lookup that needs more fields.
+        """
+        identity_map = _identity_map()
+        if identity_map is None:
+            return load()
+        if key not in identity_map:
+            user = load()
+            identity_map[key] = user
+            if user is not None and "name" in user:
+                fields = key[-1]
+                identity_map[("id", str(user["_id"]), fields)] = user
+                identity_map[("name", user["name"], fields)] = user
+        return identity_map[key]
+
+    def _invalidate(self):
+        """Drop cached lookups after a write so the rest of the request, and
+        every process's roster cache, see it"""
+        identity_map = _identity_map()
+        if identity_map is not None:
+            identity_map.clear()
+        bump_roster_version(self.db)
+
+    def new_document(self, name, hashed_key=None, key_tag=None):
+        """Build a user document; the key must already be hashed and tagged"""
         user = {
             "name": name,
-            "secretKey": None,
-            "assignedTo": None,
-            "seenAssignment": False,
+            "secretKey": hashed_key,
+            "seenGeneration": None,
             "createdAt": datetime.now(timezone.utc),
         }
+        if key_tag:
+            user["secretKeyTag"] = key_tag
+        return user
+
+    def create(self, name, secret_key=None):
+        """Create a new user with optional secret key"""
+        user = self.new_document(name)
         
         # Only hash and set secret key if provided
         if secret_key:
-            hashed_key = bcrypt.hashpw(secret_key.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+            hashed_key = crypto_pool.hash_secret(secret_key)
             user["secretKey"] = hashed_key
+            user["secretKeyTag"] = lookup_tag(secret_key)
         
         result = self.collection.insert_one(user)
         user["_id"] = result.inserted_id
+        self._invalidate()
         return user
 
-    def find_by_name(self, name):
-        """Find user by name"""
-        return self.collection.find_one({"name": name})
+    def create_many(self, users):
+        """Insert prepared user documents with one unordered insert_many
+
+        Returns (created, failures): the inserted documents, and a dict mapping
+        the index of each rejected document to its error message.
+        """
+        if not users:
+            return [], {}
+        failures = {}
+        try:
+            self.collection.insert_many(users, ordered=False)
+        except BulkWriteError as error:
+            for write_error in error.details.get("writeErrors", []):
+                if write_error.get("code") == 11000:
+                    message = "User already exists"
+                else:
+                    message = write_error.get("errmsg", "Insert failed")
+                failures[write_error["index"]] = message
+        created = [user for index, user in enumerate(users) if index not in failures]
+        if created:
+            self._invalidate()
+        return created, failures
+
+    def find_existing_names(self, names):
+        """Which of these names already belong to a user (one $in query)"""
+        if not names:
+            return set()
+        existing = self.collection.find({"name": {"$in": list(names)}}, {"_id": 0, "name": 1})
+        return {user["name"] for user in existing}
+
+    def find_by_name(self, name, fresh=False, fields=None):
+        """Find user by name; fresh=True bypasses the roster cache
 
-    def find_by_id(self, user_id):
-        """Find user by ID"""
-        return self.collection.find_one({"_id": ObjectId(user_id)})
+        fields limits the document to a field set (None: all fields). Field sets
+        within ROSTER_FIELDS are answered from the roster cache.
+        """
+        roster = self._roster(fresh, fields)
+        if roster is not None:
+            return roster["by_name"].get(name)
+        return self._cached(
+            ("name", name, fields),
+            lambda: self.collection.find_one({"name": name}, projection(fields)),
+        )
+
+    def find_by_id(self, user_id, fresh=False, fields=None):
+        """Find user by ID; fresh=True bypasses the roster cache
+
+        fields limits the document to a field set (None: all fields). Field sets
+        within ROSTER_FIELDS are answered from the roster cache.
+        """
+        roster = self._roster(fresh, fields)
+        if roster is not None:
+            return roster["by_id"].get(str(user_id))
+        return self._cached(
+            ("id", str(user_id), fields),
+            lambda: self.collection.find_one({"_id": ObjectId(user_id)}, projection(fields)),
+        )
 
-    def find_all(self):
-        """Find all users"""
-        return list(self.collection.find({}))
+    def roster_version(self):
+        """Version of the roster that non-fresh lookups answer from
+
+        Any write through this model (and the scripts) bumps it, so it works
+        as a validator for responses built from users, seen flags included.
+        """
+        roster = self._roster(fresh=False)
+        if roster is not None:
+            return roster["version"]
+        return roster_cache._read_version(self.db)
+
+    def find_all(self, fields=None):
+        """Find all users, limited to a field set if given"""
+        roster = self._roster(False, fields)
+        if roster is not None:
+            return list(roster["by_id"].values())
+        return list(self.collection.find({}, projection(fields)))
+
+    def find_roster(self, after=None, limit=None, ids=None):
+        """Read users' _id and name straight from the database, ordered by _id
+
+        after/limit page through the roster; ids restricts it to those users.
+        """
+        query = {}
+        if after:
+            query["_id"] = {"$gt": ObjectId(after)}
+        if ids is not None:
+            query["_id"] = {"$in": [ObjectId(user_id) for user_id in ids]}
+        cursor = self.collection.find(query, {"name": 1}).sort("_id", 1)
+        if limit:
+            cursor = cursor.limit(limit)
+        return list(cursor)
+
+    def find_roster_with_assignees(self, generation, after=None, limit=None):
+        """Users ordered by _id with the name of whoever they drew in a generation
+
+        Reads only _id and name, so hashes are never loaded, and joins in memory
+        against the cached assignment set: one round trip for the whole roster,
+        plus one for assignee names outside the page when paging with
+        after/limit. Returns dicts with _id, name and assignedTo (a name or None).
+        """
+        users = self.find_roster(after=after, limit=limit)
+        receiver_of = Assignment(self.db).active_set(generation)["receiver_of"]
+
+        names = {str(user["_id"]): user["name"] for user in users}
+        missing = {
+            receiver_of[user_id]
+            for user_id in names
+            if receiver_of.get(user_id) and receiver_of[user_id] not in names
+        }
+        if missing:
+            for user in self.find_roster(ids=missing):
+                names[str(user["_id"])] = user["name"]
+
+        for user in users:
+            user["assignedTo"] = names.get(receiver_of.get(str(user["_id"])))
+        return users
+
+    def find_by_secret_key(self, secret_key):
+        """Find the user whose secret key matches, for the legacy name-less login
+
+        One indexed lookup and at most one bcrypt check. Keys without a tag
+        (set before tags existed, or tagged with a rotated lookup key) aren't
+        found until their user logs in by name once, which tags them.
+        """
+        user = self.collection.find_one(
+            {"secretKeyTag": lookup_tag(secret_key)}, projection(CREDENTIAL_FIELDS)
+        )
+        if user and self.verify_secret_key(user, secret_key):
+            return user
+        return None
 
     def verify_secret_key(self, user, secret_key):
         """Verify secret key against stored hash"""
         if not user or "secretKey" not in user or user["secretKey"] is None:
             return False
-        return bcrypt.checkpw(secret_key.encode("utf-8"), user["secretKey"].encode("utf-8"))
-
-    def update_assignment(self, user_id, assigned_to_id):
-        """Update user's assignment"""
-        self.collection.update_one(
-            {"_id": ObjectId(user_id)},
-            {"$set": {"assignedTo": ObjectId(assigned_to_id)}}
-        )
+        if not verified_keys.contains(user["_id"], user["secretKey"], secret_key):
+            if not crypto_pool.check_secret(secret_key, user["secretKey"]):
+                return False
+            verified_keys.remember(user["_id"], user["secretKey"], secret_key)
+        tag = lookup_tag(secret_key)
+        if user.get("secretKeyTag") != tag:
+            # Backfill tags for keys set before tags were stored, and re-tag
+            # keys whose tag was made with a previous SECRET_KEY_LOOKUP_KEY
+            self.collection.update_one(
+                {"_id": user["_id"], "secretKey": user["secretKey"]},
+                {"$set": {"secretKeyTag": tag}},
+            )
+            user["secretKeyTag"] = tag
+        return True
 
-    def clear_all_assignments(self):
-        """Clear all assignments"""
-        self.collection.update_many({}, {"$set": {"assignedTo": None}})
-
-    def get_assigned_user(self, user_id):
+    def get_assigned_user(self, user_id, generation=None, fields=PUBLIC_FIELDS):
         """Get the user that this user is assigned to"""
-        user = self.find_by_id(user_id)
-        if not user or not user.get("assignedTo"):
+        assigned_to_id = Assignment(self.db).get_receiver_id(user_id, generation)
+        if not assigned_to_id:
             return None
-        
-        assigned_user = self.find_by_id(user["assignedTo"])
-        return assigned_user
+        return self.find_by_id(assigned_to_id, fields=fields)
 
-    def get_user_assigned_to_me(self, user_id):
+    def get_user_assigned_to_me(self, user_id, generation=None, fields=PUBLIC_FIELDS):
         """Get the user who is assigned to this user (their Secret Santa)"""
-        # Find all users who have this user as their assignment
-        user = self.find_by_id(user_id)
-        if not user:
+        santa_id = Assignment(self.db).get_giver_id(user_id, generation)
+        if not santa_id:
             return None
-        
-        # Find user where assignedTo == user_id
-        santa = self.collection.find_one({"assignedTo": ObjectId(user_id)})
-        return santa
+        return self.find_by_id(santa_id, fields=fields)
 
     def update_secret_key(self, user_id, secret_key):
         """Update user's secret key"""
-        hashed_key = bcrypt.hashpw(secret_key.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+        hashed_key = crypto_pool.hash_secret(secret_key)
         self.collection.update_one(
             {"_id": ObjectId(user_id)},
-            {"$set": {"secretKey": hashed_key}}
+            {"$set": {"secretKey": hashed_key, "secretKeyTag": lookup_tag(secret_key)}}
         )
+        verified_keys.forget(user_id)
+        self._invalidate()
+
+    def needs_rehash(self, user):
+        """True if the user's stored hash uses a different cost than configured"""
+        return self.has_secret_key(user) and crypto_pool.needs_rehash(user["secretKey"])
 
     def has_secret_key(self, user):
         """Check if user has a secret key set"""
         return user and "secretKey" in user and user["secretKey"] is not None
 
-    def mark_assignment_seen(self, user_id):
-        """Mark that user has seen their assignment"""
+    def has_seen_assignment(self, user, generation):
+        """Check if user has seen the assignment of the given generation"""
+        return user.get("seenGeneration") == generation
+
+    def mark_assignment_seen(self, user_id, generation):
+        """Mark that user has seen their assignment in this generation
+
+        A new shuffle activates a new generation, which resets this for everyone
+        without writing to each user.
+        """
         self.collection.update_one(
             {"_id": ObjectId(user_id)},
-            {"$set": {"seenAssignment": True}}
+            {"$set": {"seenGeneration": generation}}
         )
-
-    def reset_all_seen_assignments(self):
-        """Reset seenAssignment to False for all users"""
-        self.collection.update_many({}, {"$set": {"seenAssignment": False}})
-
+        self._invalidate()
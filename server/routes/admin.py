@@ -1,57 +1,54 @@
+import io
+from bson import ObjectId
 from flask import Blueprint, request, jsonify, current_app
 from models.user import User
-import random
+from models.assignment import Assignment
+from services.crypto_pool import CryptoBusyError, crypto_busy_response
+from services.shuffle_engine import shuffle_assignments
+from services.user_import import FORMATS, import_users, read_rows
 
 admin_bp = Blueprint("admin", __name__)
 
 
 @admin_bp.route("/init-users", methods=["POST"])
 def init_users():
+    """Create users in bulk from {"users": [...]}, or from a streamed CSV
+    (text/csv, header name,secretKey) or NDJSON (application/x-ndjson) body"""
     try:
         db = current_app.config["MONGO_DB"]
-        user_model = User(db)
-
-        data = request.get_json()
-        users_data = data.get("users", [])
 
-        if not isinstance(users_data, list) or len(users_data) == 0:
+        fmt = FORMATS.get(request.mimetype)
+        if fmt:
+            # Parsed while it is read, so large imports never sit in memory whole
+            rows = read_rows(io.TextIOWrapper(request.stream, encoding="utf-8", newline=""), fmt)
+        else:
+            data = request.get_json(silent=True) or {}
+            rows = data.get("users", [])
+            if not isinstance(rows, list) or len(rows) == 0:
+                return jsonify({"error": "Users array is required"}), 400
+
+        result = import_users(
+            db,
+            rows,
+            batch_size=current_app.config.get("IMPORT_BATCH_SIZE", 1000),
+            processes=current_app.config.get("IMPORT_HASH_PROCESSES", 0),
+        )
+        if not result["created"] and not result["errors"]:
             return jsonify({"error": "Users array is required"}), 400
 
-        created_users = []
-        errors = []
-
-        for user_data in users_data:
-            try:
-                name = user_data.get("name")
-                secret_key = user_data.get("secretKey")  # Optional
-
-                if not name:
-                    errors.append({
-                        "name": "Unknown",
-                        "error": "Name is required",
-                    })
-                    continue
-
-                # Check if user already exists
-                existing = user_model.find_by_name(name)
-                if existing:
-                    errors.append({"name": name, "error": "User already exists"})
-                    continue
-
-                # Create user with or without secret key
-                user = user_model.create(name, secret_key)
-                created_users.append({"name": user["name"], "id": str(user["_id"])})
-            except Exception as error:
-                errors.append({"name": user_data.get("name", "Unknown"), "error": str(error)})
-
         response = {
             "message": "Users initialized",
-            "created": created_users,
+            "created": result["created"],
         }
-        if errors:
-            response["errors"] = errors
+        if result["errors"]:
+            response["errors"] = result["errors"]
 
         return jsonify(response)
+    except CryptoBusyError:
+        # Batches inserted so far are kept; a retry reports them as existing
+        return crypto_busy_response()
+    except ValueError as error:
+        return jsonify({"error": str(error)}), 400
     except Exception as error:
         print(f"Init users error: {error}")
         return jsonify({"error": "Server error"}), 500
@@ -59,69 +56,26 @@ def init_users():
 
 @admin_bp.route("/shuffle", methods=["POST"])
 def shuffle():
+    """Shuffle assignments, optionally with exclusion rules in the body:
+    {"households": [[names]], "exclusions": [[giver, receiver]], "avoidPrevious": bool}
+    """
     try:
         db = current_app.config["MONGO_DB"]
-        user_model = User(db)
 
-        users = user_model.find_all()
-
-        if len(users) < 2:
-            return jsonify({"error": "Need at least 2 users to shuffle"}), 400
-
-        # Fisher-Yates shuffle
-        shuffled = users.copy()
-        attempts = 0
-        max_attempts = 100
-
-        while attempts < max_attempts:
-            random.shuffle(shuffled)
-
-            # Check if valid (no self-assignments)
-            valid = True
-            for i in range(len(users)):
-                if str(users[i]["_id"]) == str(shuffled[i]["_id"]):
-                    valid = False
-                    break
-
-            if valid:
-                # Reset seenAssignment for all users first
-                user_model.reset_all_seen_assignments()
-                # Assign
-                for i in range(len(users)):
-                    user_model.update_assignment(
-                        str(users[i]["_id"]), str(shuffled[i]["_id"])
-                    )
-
-                assignments = [
-                    {"name": users[i]["name"], "assignedTo": shuffled[i]["name"]}
-                    for i in range(len(users))
-                ]
-
-                return jsonify({
-                    "message": "Assignments shuffled successfully",
-                    "assignments": assignments,
-                })
-
-            attempts += 1
-
-        # Fallback: force fix self-assignments
-        # Reset seenAssignment for all users first
-        user_model.reset_all_seen_assignments()
-        for i in range(len(users)):
-            if str(users[i]["_id"]) == str(shuffled[i]["_id"]):
-                next_index = (i + 1) % len(shuffled)
-                shuffled[i], shuffled[next_index] = shuffled[next_index], shuffled[i]
-            user_model.update_assignment(
-                str(users[i]["_id"]), str(shuffled[i]["_id"])
-            )
-
-        assignments = [
-            {"name": users[i]["name"], "assignedTo": shuffled[i]["name"]}
-            for i in range(len(users))
-        ]
+        data = request.get_json(silent=True) or {}
+        rules = {
+            key: data[key]
+            for key in ("households", "exclusions", "avoidPrevious")
+            if data.get(key)
+        }
+
+        try:
+            assignments = shuffle_assignments(db, rules)
+        except ValueError as error:
+            return jsonify({"error": str(error)}), 400
 
         return jsonify({
-            "message": "Assignments shuffled (with fallback fix)",
+            "message": "Assignments shuffled successfully",
             "assignments": assignments,
         })
     except Exception as error:
@@ -131,25 +85,33 @@ def shuffle():
 
 @admin_bp.route("/users", methods=["GET"])
 def get_users():
+    """List users with their assignee's name; ?limit=&after=<id> pages by id"""
     try:
         db = current_app.config["MONGO_DB"]
         user_model = User(db)
 
-        users = user_model.find_all()
-        users_list = []
+        limit = request.args.get("limit", type=int)
+        after = request.args.get("after")
+        if after is not None and not ObjectId.is_valid(after):
+            return jsonify({"error": "Invalid cursor"}), 400
+        users = user_model.find_roster_with_assignees(
+            Assignment(db).active_generation(), after=after, limit=limit
+        )
 
+        users_list = []
         for user in users:
             user_data = {
                 "id": str(user["_id"]),
                 "name": user["name"],
             }
             if user.get("assignedTo"):
-                assigned_user = user_model.find_by_id(user["assignedTo"])
-                if assigned_user:
-                    user_data["assignedTo"] = assigned_user["name"]
+                user_data["assignedTo"] = user["assignedTo"]
             users_list.append(user_data)
 
-        return jsonify({"users": users_list})
+        response = {"users": users_list}
+        if limit and len(users_list) == limit:
+            response["next"] = users_list[-1]["id"]
+        return jsonify(response)
     except Exception as error:
         print(f"Get users error: {error}")
         return jsonify({"error": "Server error"}), 500
@@ -159,9 +121,9 @@ def get_users():
 def clear_assignments():
     try:
         db = current_app.config["MONGO_DB"]
-        user_model = User(db)
 
-        user_model.clear_all_assignments()
+        # Activates an empty assignment set in a single write
+        Assignment(db).clear()
         return jsonify({"message": "All assignments cleared"})
     except Exception as error:
         print(f"Clear assignments error: {error}")
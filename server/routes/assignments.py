@@ -1,44 +1,68 @@
 from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models.user import User
+from models.user import User, PUBLIC_FIELDS, PROFILE_FIELDS
+from models.assignment import Assignment
+from middleware.auth import current_assignment
+from middleware.conditional import conditional
 
 assignments_bp = Blueprint("assignments", __name__)
 
 
+def assignment_payload(user_model, user, assigned_to_id):
+    """The my-assignment body for a user and the id of the user they drew"""
+    if not assigned_to_id:
+        return {
+            "assigned": False,
+            "message": "No assignment yet. Wait for admin to shuffle!",
+        }
+
+    assigned_user = user_model.find_by_id(assigned_to_id, fields=PUBLIC_FIELDS)
+
+    if not assigned_user:
+        return {
+            "assigned": False,
+            "message": "Assignment not found",
+        }
+
+    return {
+        "assigned": True,
+        "seenAssignment": user_model.has_seen_assignment(
+            user, Assignment(user_model.db).active_generation()
+        ),
+        "assignedTo": {
+            "name": assigned_user["name"],
+        },
+    }
+
+
+def my_assignment_validator():
+    # Seen flags live on the user, so marking seen bumps the roster version too
+    db = current_app.config["MONGO_DB"]
+    return (
+        get_jwt_identity(),
+        Assignment(db).active_generation(),
+        User(db).roster_version(),
+    )
+
+
 @assignments_bp.route("/my-assignment", methods=["GET"])
 @jwt_required()
+@conditional(my_assignment_validator)
 def get_my_assignment():
     try:
         db = current_app.config["MONGO_DB"]
         user_model = User(db)
 
         user_id = get_jwt_identity()
-        user = user_model.find_by_id(user_id)
+        user = user_model.find_by_id(user_id, fields=PROFILE_FIELDS)
 
         if not user:
             return jsonify({"error": "User not found"}), 404
 
-        if not user.get("assignedTo"):
-            return jsonify({
-                "assigned": False,
-                "message": "No assignment yet. Wait for admin to shuffle!",
-            })
-
-        assigned_user = user_model.get_assigned_user(user_id)
-
-        if not assigned_user:
-            return jsonify({
-                "assigned": False,
-                "message": "Assignment not found",
-            })
-
-        return jsonify({
-            "assigned": True,
-            "seenAssignment": user.get("seenAssignment", False),
-            "assignedTo": {
-                "name": assigned_user["name"],
-            },
-        })
+        # The assignee comes from the token claims while they're current
+        assignment = current_assignment(user_model)
+        assigned_to_id = assignment[0] if assignment else None
+        return jsonify(assignment_payload(user_model, user, assigned_to_id))
     except Exception as error:
         print(f"Get assignment error: {error}")
         return jsonify({"error": "Server error"}), 500
@@ -53,12 +77,12 @@ def mark_assignment_seen():
         user_model = User(db)
 
         user_id = get_jwt_identity()
-        user = user_model.find_by_id(user_id)
+        user = user_model.find_by_id(user_id, fields=PUBLIC_FIELDS)
 
         if not user:
             return jsonify({"error": "User not found"}), 404
 
-        user_model.mark_assignment_seen(user_id)
+        user_model.mark_assignment_seen(user_id, Assignment(db).active_generation())
 
         return jsonify({
             "message": "Assignment marked as seen",
@@ -1,11 +1,26 @@
 from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
-from models.user import User
+from models.user import User, PUBLIC_FIELDS, CREDENTIAL_FIELDS
+from middleware.auth import assignment_claims, has_current_assignment_claims
+from middleware.conditional import conditional
+from services.crypto_pool import CryptoBusyError, crypto_busy_response
 from datetime import timedelta
 
 auth_bp = Blueprint("auth", __name__)
 
 
+def create_user_token(user_model, user):
+    """Create a 7-day JWT carrying the user's assignment claims"""
+    return create_access_token(
+        identity=str(user["_id"]),
+        additional_claims={
+            "userName": user["name"],
+            **assignment_claims(user_model, user),
+        },
+        expires_delta=timedelta(days=7)
+    )
+
+
 @auth_bp.route("/login", methods=["POST"])
 def login():
     try:
@@ -22,7 +37,7 @@ def login():
 
         # If name is provided, find user by name first
         if name:
-            user = user_model.find_by_name(name)
+            user = user_model.find_by_name(name, fresh=True, fields=CREDENTIAL_FIELDS)
             if not user:
                 return jsonify({"error": "User not found"}), 404
             
@@ -30,24 +45,23 @@ def login():
             if not user_model.verify_secret_key(user, secret_key):
                 return jsonify({"error": "Invalid secret key"}), 401
         else:
-            # Legacy: Find user by comparing secret key across all users
-            users = user_model.find_all()
-            user = None
-
-            for u in users:
-                if user_model.verify_secret_key(u, secret_key):
-                    user = u
-                    break
+            # Legacy: Find user by the secret key's lookup tag
+            user = user_model.find_by_secret_key(secret_key)
 
             if not user:
-                return jsonify({"error": "Invalid secret key"}), 401
+                # Untagged keys can't be found without a name; never bcrypt-scan for them
+                return jsonify({"error": "Invalid secret key. Log in with your name"}), 401
+
+        # Upgrade hashes made with an old cost while we have the plaintext key
+        if user_model.needs_rehash(user):
+            try:
+                user_model.update_secret_key(str(user["_id"]), secret_key)
+            except Exception as error:
+                # Best effort: the login itself already succeeded
+                print(f"Rehash error: {error}")
 
         # Generate JWT token
-        token = create_access_token(
-            identity=str(user["_id"]),
-            additional_claims={"userName": user["name"]},
-            expires_delta=timedelta(days=7)
-        )
+        token = create_user_token(user_model, user)
 
         return jsonify({
             "token": token,
@@ -56,6 +70,8 @@ def login():
                 "name": user["name"],
             },
         })
+    except CryptoBusyError:
+        return crypto_busy_response()
     except Exception as error:
         print(f"Login error: {error}")
         return jsonify({"error": "Server error during login"}), 500
@@ -70,21 +86,32 @@ def verify():
         
         user_id = get_jwt_identity()
         
-        user = user_model.find_by_id(user_id)
+        # A shuffle since the token was issued makes its assignment claims stale,
+        # so hand back a replacement token built from the current assignments
+        refresh = not has_current_assignment_claims(db)
+        user = user_model.find_by_id(user_id, fresh=refresh, fields=PUBLIC_FIELDS)
         if not user:
             return jsonify({"error": "User not found"}), 404
 
-        return jsonify({
+        response = {
             "user": {
                 "id": str(user["_id"]),
                 "name": user["name"],
             },
-        })
+        }
+        if refresh:
+            response["token"] = create_user_token(user_model, user)
+        return jsonify(response)
     except Exception as e:
         return jsonify({"error": "Invalid token"}), 401
 
 
+def users_validator():
+    return ("users", User(current_app.config["MONGO_DB"]).roster_version())
+
+
 @auth_bp.route("/users", methods=["GET"])
+@conditional(users_validator)
 def get_users():
     """Get list of all users (names only)"""
     try:
@@ -94,7 +121,7 @@ def get_users():
         
         user_model = User(db)
         
-        users = user_model.find_all()
+        users = user_model.find_all(fields=PUBLIC_FIELDS)
         user_names = [{"name": user["name"]} for user in users]
         
         return jsonify({"users": user_names})
@@ -110,7 +137,7 @@ def check_key(name):
         db = current_app.config["MONGO_DB"]
         user_model = User(db)
         
-        user = user_model.find_by_name(name)
+        user = user_model.find_by_name(name, fresh=True, fields=CREDENTIAL_FIELDS)
         if not user:
             return jsonify({"error": "User not found"}), 404
         
@@ -138,7 +165,7 @@ def verify_key(name):
         db = current_app.config["MONGO_DB"]
         user_model = User(db)
         
-        user = user_model.find_by_name(name)
+        user = user_model.find_by_name(name, fresh=True, fields=CREDENTIAL_FIELDS)
         if not user:
             return jsonify({"error": "User not found"}), 404
         
@@ -149,6 +176,8 @@ def verify_key(name):
             "valid": is_valid,
             "name": user["name"]
         })
+    except CryptoBusyError:
+        return crypto_busy_response()
     except Exception as error:
         print(f"Verify key error: {error}")
         return jsonify({"error": "Server error"}), 500
@@ -168,7 +197,7 @@ def set_key(name):
         db = current_app.config["MONGO_DB"]
         user_model = User(db)
         
-        user = user_model.find_by_name(name)
+        user = user_model.find_by_name(name, fresh=True, fields=CREDENTIAL_FIELDS)
         if not user:
             return jsonify({"error": "User not found"}), 404
         
@@ -184,6 +213,8 @@ def set_key(name):
             "message": "Secret key updated successfully",
             "name": user["name"]
         })
+    except CryptoBusyError:
+        return crypto_busy_response()
     except Exception as error:
         print(f"Set key error: {error}")
         return jsonify({"error": "Server error"}), 500
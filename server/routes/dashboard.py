@@ -0,0 +1,63 @@
+from flask import Blueprint, jsonify, current_app
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from models.user import User, PROFILE_FIELDS, PUBLIC_FIELDS
+from models.message import Message
+from middleware.auth import current_assignment, has_current_assignment_claims
+from routes.auth import create_user_token
+from routes.assignments import assignment_payload
+from routes.messages import DEFAULT_PAGE_SIZE, conversation_payload
+
+dashboard_bp = Blueprint("dashboard", __name__)
+
+
+@dashboard_bp.route("", methods=["GET"])
+@jwt_required()
+def get_dashboard():
+    """Everything the dashboard's first paint needs in one request
+
+    Replaces /auth/verify, /auth/users, /assignments/my-assignment and the two
+    conversation reads. Users and assignments come from the process caches;
+    both conversation heads are one aggregation.
+    """
+    try:
+        db = current_app.config["MONGO_DB"]
+        user_model = User(db)
+
+        user_id = get_jwt_identity()
+
+        # Like /auth/verify: stale assignment claims get a replacement token
+        refresh = not has_current_assignment_claims(db)
+        user = user_model.find_by_id(user_id, fresh=refresh, fields=PROFILE_FIELDS)
+        if not user:
+            return jsonify({"error": "User not found"}), 404
+
+        response = {
+            "user": {
+                "id": str(user["_id"]),
+                "name": user["name"],
+            },
+        }
+        if refresh:
+            response["token"] = create_user_token(user_model, user)
+
+        assigned_to_id, santa_id = current_assignment(user_model) or (None, None)
+        response["assignment"] = assignment_payload(user_model, user, assigned_to_id)
+        response["users"] = [
+            {"name": other["name"]} for other in user_model.find_all(fields=PUBLIC_FIELDS)
+        ]
+
+        heads = Message(db).get_conversation_heads(
+            user_id, [assigned_to_id, santa_id], DEFAULT_PAGE_SIZE
+        )
+        conversations = {}
+        for role, other_id in (("assignment", assigned_to_id), ("santa", santa_id)):
+            other_user = user_model.find_by_id(other_id, fields=PUBLIC_FIELDS) if other_id else None
+            conversations[role] = conversation_payload(
+                heads.get(other_id, []), other_user, user_id, limit=DEFAULT_PAGE_SIZE
+            )
+        response["conversations"] = conversations
+
+        return jsonify(response)
+    except Exception as error:
+        print(f"Get dashboard error: {error}")
+        return jsonify({"error": "Server error"}), 500
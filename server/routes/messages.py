@@ -1,12 +1,21 @@
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, Response, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models.user import User
-from models.message import Message
+from models.user import User, PUBLIC_FIELDS
+from models.message import Message, conversation_id, encode_cursor
+from models.inbox import InboxSummary
+from middleware.auth import current_assignment
+from middleware.conditional import conditional
 from bson import ObjectId
 from datetime import timezone
+import json
+import queue
+import time
 
 messages_bp = Blueprint("messages", __name__)
 
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
 
 def format_datetime_utc(dt):
     """Format datetime to ISO string with UTC timezone indicator (Z suffix)"""
@@ -20,8 +29,147 @@ def format_datetime_utc(dt):
     return dt_str
 
 
+def format_message(msg, user_id):
+    """Format a message document for the frontend"""
+    return {
+        "id": str(msg["_id"]),
+        "message": msg["message"],
+        "senderId": str(msg["senderId"]),
+        "receiverId": str(msg["receiverId"]),
+        "isFromMe": str(msg["senderId"]) == user_id,
+        "createdAt": format_datetime_utc(msg["createdAt"]),
+    }
+
+
+def read_page_args():
+    """Read the since/before/limit pagination query parameters"""
+    limit = request.args.get("limit", DEFAULT_PAGE_SIZE, type=int)
+    return {
+        "since": request.args.get("since"),
+        "before": request.args.get("before"),
+        "limit": max(1, min(limit, MAX_PAGE_SIZE)),
+    }
+
+
+def conversation_payload(messages, other_user, user_id, since=None, before=None, limit=None):
+    """Build a conversation payload with the cursors for the next requests
+
+    cursor: pass back as ?since= to receive only newer messages
+    olderCursor: pass back as ?before= to load the previous page
+    hasMore: the page was full, so more messages exist in that direction
+    """
+    if other_user is None:
+        return {"messages": [], "otherUser": None}
+    payload = {
+        "messages": [format_message(msg, user_id) for msg in messages],
+        "otherUser": {
+            "id": str(other_user["_id"]),
+            "name": other_user["name"],
+        },
+        "hasMore": limit is not None and len(messages) == limit,
+    }
+    if not before:
+        payload["cursor"] = encode_cursor(messages[-1]) if messages else since
+    if not since:
+        payload["olderCursor"] = encode_cursor(messages[0]) if messages else None
+    return payload
+
+
+def conversation_response(messages, other_user, user_id, since=None, before=None, limit=None):
+    return jsonify(conversation_payload(messages, other_user, user_id, since, before, limit))
+
+
+def conversation_validator(role):
+    """Validator for a conversation: who it is with and its newest message
+
+    role is "assignment" or "santa". Messages are never edited, so a page only
+    changes when a newer message arrives (or the other side changes).
+    """
+    def validator():
+        db = current_app.config["MONGO_DB"]
+        user_model = User(db)
+        assignment = current_assignment(user_model)
+        if assignment is None:
+            return None
+        assigned_to_id, santa_id = assignment
+        other_id = assigned_to_id if role == "assignment" else santa_id
+        user_id = get_jwt_identity()
+        latest_id = Message(db).latest_message_id(user_id, other_id) if other_id else None
+        return (user_id, other_id, user_model.roster_version(), str(latest_id))
+
+    return validator
+
+
+def format_event(event):
+    """Format a dict as a server-sent event"""
+    return f"data: {json.dumps(event)}\n\n"
+
+
+def streaming_unsupported_reason(broker):
+    """Why this worker can't hold message streams, or None if it can"""
+    mode = current_app.config["STREAMING"]
+    if mode == "off":
+        return "Message streaming is disabled"
+    if mode == "auto" and not request.environ.get("wsgi.multithread"):
+        return "Message streaming needs a threaded worker"
+    if request.environ.get("wsgi.multiprocess") and not broker.cross_process:
+        # Messages sent through another worker would never reach this stream
+        return "Message streaming across workers needs MESSAGE_BROKER=changestream"
+    return None
+
+
+@messages_bp.route("/stream", methods=["GET"])
+@jwt_required()
+def stream_messages():
+    """Push new messages to or from the current user as server-sent events
+
+    Answers 501 when this deployment can't stream (the client keeps polling),
+    and 503 when this worker already holds STREAM_MAX_SUBSCRIBERS streams.
+    """
+    broker = current_app.config["MESSAGE_BROKER"]
+    keepalive = current_app.config["STREAM_KEEPALIVE_SECONDS"]
+    max_seconds = current_app.config["STREAM_MAX_SECONDS"]
+
+    reason = streaming_unsupported_reason(broker)
+    if reason:
+        return jsonify({"error": reason}), 501
+    if broker.subscriber_count() >= current_app.config["STREAM_MAX_SUBSCRIBERS"]:
+        response = jsonify({"error": "Too many open message streams"})
+        response.headers["Retry-After"] = "60"
+        return response, 503
+
+    user_id = get_jwt_identity()
+    subscription = broker.subscribe(user_id)
+
+    def generate():
+        # Streams end after max_seconds so connections don't pin a worker forever;
+        # the client reconnects and catches up with an incremental poll
+        deadline = time.monotonic() + max_seconds
+        try:
+            yield format_event({"type": "ready"})
+            while time.monotonic() < deadline:
+                try:
+                    message = subscription.get(timeout=keepalive)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                yield format_event({
+                    "type": "message",
+                    "message": format_message(message, user_id),
+                })
+        finally:
+            broker.unsubscribe(user_id, subscription)
+
+    return Response(
+        generate(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @messages_bp.route("/conversation/assignment", methods=["GET"])
 @jwt_required()
+@conditional(conversation_validator("assignment"))
 def get_assignment_conversation():
     """Get conversation with the user you're assigned to"""
     try:
@@ -30,18 +178,19 @@ def get_assignment_conversation():
         message_model = Message(db)
 
         user_id = get_jwt_identity()
-        user = user_model.find_by_id(user_id)
+        assignment = current_assignment(user_model)
 
-        if not user:
+        if assignment is None:
             return jsonify({"error": "User not found"}), 404
 
-        if not user.get("assignedTo"):
+        assigned_to_id, _ = assignment
+        if not assigned_to_id:
             return jsonify({
                 "messages": [],
                 "otherUser": None,
             })
 
-        assigned_user = user_model.get_assigned_user(user_id)
+        assigned_user = user_model.find_by_id(assigned_to_id, fields=PUBLIC_FIELDS)
         if not assigned_user:
             return jsonify({
                 "messages": [],
@@ -49,27 +198,15 @@ def get_assignment_conversation():
             })
 
         # Get conversation between current user and assigned user
-        messages = message_model.get_conversation(user_id, str(assigned_user["_id"]))
-
-        # Format messages for frontend
-        formatted_messages = []
-        for msg in messages:
-            formatted_messages.append({
-                "id": str(msg["_id"]),
-                "message": msg["message"],
-                "senderId": str(msg["senderId"]),
-                "receiverId": str(msg["receiverId"]),
-                "isFromMe": str(msg["senderId"]) == user_id,
-                "createdAt": format_datetime_utc(msg["createdAt"]),
-            })
-
-        return jsonify({
-            "messages": formatted_messages,
-            "otherUser": {
-                "id": str(assigned_user["_id"]),
-                "name": assigned_user["name"],
-            },
-        })
+        page = read_page_args()
+        try:
+            messages = message_model.get_conversation(
+                user_id, str(assigned_user["_id"]), **page
+            )
+        except ValueError:
+            return jsonify({"error": "Invalid cursor"}), 400
+
+        return conversation_response(messages, assigned_user, user_id, **page)
     except Exception as error:
         print(f"Get assignment conversation error: {error}")
         return jsonify({"error": "Server error"}), 500
@@ -77,6 +214,7 @@ def get_assignment_conversation():
 
 @messages_bp.route("/conversation/santa", methods=["GET"])
 @jwt_required()
+@conditional(conversation_validator("santa"))
 def get_santa_conversation():
     """Get conversation with the user who is assigned to you (your Secret Santa)"""
     try:
@@ -85,13 +223,14 @@ def get_santa_conversation():
         message_model = Message(db)
 
         user_id = get_jwt_identity()
-        user = user_model.find_by_id(user_id)
+        assignment = current_assignment(user_model)
 
-        if not user:
+        if assignment is None:
             return jsonify({"error": "User not found"}), 404
 
         # Find who is assigned to this user
-        santa = user_model.get_user_assigned_to_me(user_id)
+        _, santa_id = assignment
+        santa = user_model.find_by_id(santa_id, fields=PUBLIC_FIELDS) if santa_id else None
         if not santa:
             return jsonify({
                 "messages": [],
@@ -99,27 +238,15 @@ def get_santa_conversation():
             })
 
         # Get conversation between current user and their Secret Santa
-        messages = message_model.get_conversation(user_id, str(santa["_id"]))
-
-        # Format messages for frontend
-        formatted_messages = []
-        for msg in messages:
-            formatted_messages.append({
-                "id": str(msg["_id"]),
-                "message": msg["message"],
-                "senderId": str(msg["senderId"]),
-                "receiverId": str(msg["receiverId"]),
-                "isFromMe": str(msg["senderId"]) == user_id,
-                "createdAt": format_datetime_utc(msg["createdAt"]),
-            })
-
-        return jsonify({
-            "messages": formatted_messages,
-            "otherUser": {
-                "id": str(santa["_id"]),
-                "name": santa["name"],
-            },
-        })
+        page = read_page_args()
+        try:
+            messages = message_model.get_conversation(
+                user_id, str(santa["_id"]), **page
+            )
+        except ValueError:
+            return jsonify({"error": "Invalid cursor"}), 400
+
+        return conversation_response(messages, santa, user_id, **page)
     except Exception as error:
         print(f"Get santa conversation error: {error}")
         return jsonify({"error": "Server error"}), 500
@@ -135,12 +262,13 @@ def send_message_to_assignment():
         message_model = Message(db)
 
         user_id = get_jwt_identity()
-        user = user_model.find_by_id(user_id)
+        assignment = current_assignment(user_model)
 
-        if not user:
+        if assignment is None:
             return jsonify({"error": "User not found"}), 404
 
-        if not user.get("assignedTo"):
+        assigned_to_id, _ = assignment
+        if not assigned_to_id:
             return jsonify({"error": "No assignment yet"}), 400
 
         data = request.get_json()
@@ -150,17 +278,11 @@ def send_message_to_assignment():
             return jsonify({"error": "Message cannot be empty"}), 400
 
         # Create message
-        message = message_model.create(user_id, str(user["assignedTo"]), message_text)
+        message = message_model.create(user_id, assigned_to_id, message_text)
+        current_app.config["MESSAGE_BROKER"].publish(message)
 
         return jsonify({
-            "message": {
-                "id": str(message["_id"]),
-                "message": message["message"],
-                "senderId": str(message["senderId"]),
-                "receiverId": str(message["receiverId"]),
-                "isFromMe": True,
-                "createdAt": format_datetime_utc(message["createdAt"]),
-            },
+            "message": format_message(message, user_id),
         })
     except Exception as error:
         print(f"Send message to assignment error: {error}")
@@ -177,14 +299,14 @@ def send_message_to_santa():
         message_model = Message(db)
 
         user_id = get_jwt_identity()
-        user = user_model.find_by_id(user_id)
+        assignment = current_assignment(user_model)
 
-        if not user:
+        if assignment is None:
             return jsonify({"error": "User not found"}), 404
 
         # Find who is assigned to this user
-        santa = user_model.get_user_assigned_to_me(user_id)
-        if not santa:
+        _, santa_id = assignment
+        if not santa_id:
             return jsonify({"error": "No Secret Santa assigned to you yet"}), 400
 
         data = request.get_json()
@@ -194,19 +316,104 @@ def send_message_to_santa():
             return jsonify({"error": "Message cannot be empty"}), 400
 
         # Create message
-        message = message_model.create(user_id, str(santa["_id"]), message_text)
+        message = message_model.create(user_id, santa_id, message_text)
+        current_app.config["MESSAGE_BROKER"].publish(message)
 
         return jsonify({
-            "message": {
-                "id": str(message["_id"]),
-                "message": message["message"],
-                "senderId": str(message["senderId"]),
-                "receiverId": str(message["receiverId"]),
-                "isFromMe": True,
-                "createdAt": format_datetime_utc(message["createdAt"]),
-            },
+            "message": format_message(message, user_id),
         })
     except Exception as error:
         print(f"Send message to santa error: {error}")
         return jsonify({"error": "Server error"}), 500
 
+
+def conversation_partners(assignment):
+    """{"assignment": id of the user you drew, "santa": id of your Secret Santa}"""
+    assigned_to_id, santa_id = assignment
+    return {"assignment": assigned_to_id, "santa": santa_id}
+
+
+def format_summary(entry, user_id):
+    """Format one conversation of an inbox summary for the frontend"""
+    if not entry:
+        return {"unread": 0, "lastMessage": None, "updatedAt": None}
+    last_message = entry.get("lastMessage")
+    return {
+        "unread": entry.get("unread", 0),
+        "lastMessage": {
+            "id": str(last_message["id"]),
+            "preview": last_message["preview"],
+            "isFromMe": str(last_message["senderId"]) == user_id,
+            "createdAt": format_datetime_utc(last_message["createdAt"]),
+        } if last_message else None,
+        "updatedAt": format_datetime_utc(entry["updatedAt"]) if entry.get("updatedAt") else None,
+    }
+
+
+@messages_bp.route("/summary", methods=["GET"])
+@jwt_required()
+def get_summary():
+    """Unread counts and last message of both conversations, from one small document"""
+    try:
+        db = current_app.config["MONGO_DB"]
+        user_model = User(db)
+
+        user_id = get_jwt_identity()
+        assignment = current_assignment(user_model)
+
+        if assignment is None:
+            return jsonify({"error": "User not found"}), 404
+
+        inbox = InboxSummary(db).get(user_id)
+        conversation_ids = {
+            role: conversation_id(user_id, other_id) if other_id else None
+            for role, other_id in conversation_partners(assignment).items()
+        }
+        conversations = {
+            role: format_summary(inbox.get(conv_id) if conv_id else None, user_id)
+            for role, conv_id in conversation_ids.items()
+        }
+        # When your assignee is also your Santa both roles share one conversation
+        unread = sum(
+            inbox.get(conv_id, {}).get("unread", 0)
+            for conv_id in set(conversation_ids.values()) if conv_id
+        )
+        return jsonify({
+            "unread": unread,
+            "conversations": conversations,
+        })
+    except Exception as error:
+        print(f"Get message summary error: {error}")
+        return jsonify({"error": "Server error"}), 500
+
+
+@messages_bp.route("/mark-read", methods=["POST"])
+@jwt_required()
+def mark_read():
+    """Clear the unread count of one conversation ({"conversation": "assignment"
+    or "santa"}), or of both when none is given"""
+    try:
+        db = current_app.config["MONGO_DB"]
+        user_model = User(db)
+
+        user_id = get_jwt_identity()
+        assignment = current_assignment(user_model)
+
+        if assignment is None:
+            return jsonify({"error": "User not found"}), 404
+
+        data = request.get_json(silent=True) or {}
+        partners = conversation_partners(assignment)
+        role = data.get("conversation")
+        if role is not None and role not in partners:
+            return jsonify({"error": "conversation must be \"assignment\" or \"santa\""}), 400
+
+        roles = [role] if role else list(partners)
+        InboxSummary(db).mark_read(user_id, [
+            conversation_id(user_id, partners[r]) for r in roles if partners[r]
+        ])
+
+        return jsonify({"message": "Marked as read"})
+    except Exception as error:
+        print(f"Mark read error: {error}")
+        return jsonify({"error": "Server error"}), 500
@@ -0,0 +1,63 @@
+import hashlib
+import hmac
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+
+class VerifiedKeyCache:
+    """Remembers recent successful secret key checks for a few seconds
+
+    The key-entry flow verifies the same key several times in a row
+    (verify-key, then login; set-key with currentKey). Entries are keyed by an
+    HMAC of (user id, stored hash, presented key) under a random per-process
+    key, so plaintext keys are never held and a changed hash never matches.
+    """
+
+    def __init__(self, ttl=30.0, max_entries=1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._secret = secrets.token_bytes(32)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _key(self, user_id, hashed_key, secret_key):
+        material = "\0".join([str(user_id), hashed_key, secret_key]).encode("utf-8")
+        return hmac.new(self._secret, material, hashlib.sha256).digest()
+
+    def contains(self, user_id, hashed_key, secret_key):
+        """True if this exact key was verified against this hash within the TTL"""
+        if self.ttl <= 0:
+            return False
+        key = self._key(user_id, hashed_key, secret_key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False
+            if entry[1] < time.monotonic():
+                del self._entries[key]
+                return False
+            return True
+
+    def remember(self, user_id, hashed_key, secret_key):
+        """Record a successful verification"""
+        if self.ttl <= 0:
+            return
+        key = self._key(user_id, hashed_key, secret_key)
+        with self._lock:
+            self._entries[key] = (str(user_id), time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def forget(self, user_id):
+        """Drop every entry for a user, e.g. after their key changes"""
+        user_id = str(user_id)
+        with self._lock:
+            stale = [key for key, entry in self._entries.items() if entry[0] == user_id]
+            for key in stale:
+                del self._entries[key]
+
+
+verified_keys = VerifiedKeyCache()
@@ -0,0 +1,143 @@
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from flask import jsonify
+import bcrypt
+
+
+class CryptoBusyError(Exception):
+    """Raised when the bcrypt pool and its queue are full"""
+
+
+class CryptoPool:
+    """Bounded worker pool for bcrypt hashing and verification
+
+    bcrypt releases the GIL, so at most `workers` hashes burn CPU at once and
+    at most `max_queue` more wait for a worker. Anything beyond that fails
+    immediately with CryptoBusyError instead of tying up request threads
+    that the cheap polling endpoints need.
+    """
+
+    def __init__(self, workers=2, max_queue=32, retry_after=1, rounds=12):
+        self.retry_after = retry_after
+        self.rounds = rounds
+        self._executor = None
+        self._slots = None
+        self._lock = threading.Lock()
+        self.configure(workers, max_queue)
+
+    def configure(self, workers, max_queue):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+            self.workers = workers
+            self.max_queue = max_queue
+            self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+            self._slots = threading.BoundedSemaphore(workers + max_queue)
+
+    def run(self, fn, *args):
+        """Run fn(*args) on the pool and wait for its result"""
+        slots = self._slots
+        if not slots.acquire(blocking=False):
+            raise CryptoBusyError("Too many concurrent secret key operations")
+        try:
+            future = self._executor.submit(fn, *args)
+        except Exception:
+            slots.release()
+            raise
+        future.add_done_callback(lambda _: slots.release())
+        return future.result()
+
+    def hash_secret(self, secret_key):
+        """Hash a secret key with bcrypt, returning the hash as a string"""
+        return self.run(
+            lambda: bcrypt.hashpw(
+                secret_key.encode("utf-8"), bcrypt.gensalt(self.rounds)
+            ).decode("utf-8")
+        )
+
+    def hash_secrets(self, secret_keys):
+        """Hash many secret keys across all pool workers, returning hashes in order
+
+        For bulk imports: waits for free slots instead of raising
+        CryptoBusyError, and keeps at most `workers` hashes in flight so
+        logins still find room in the queue.
+        """
+        slots = self._slots
+        in_flight = threading.BoundedSemaphore(self.workers)
+        rounds = self.rounds
+
+        def release(_):
+            slots.release()
+            in_flight.release()
+
+        futures = []
+        for secret_key in secret_keys:
+            in_flight.acquire()
+            slots.acquire()
+            try:
+                future = self._executor.submit(hash_secret_with_rounds, secret_key, rounds)
+            except Exception:
+                release(None)
+                raise
+            future.add_done_callback(release)
+            futures.append(future)
+        return [future.result() for future in futures]
+
+    def check_secret(self, secret_key, hashed_key):
+        """Check a secret key against a bcrypt hash"""
+        return self.run(
+            lambda: bcrypt.checkpw(secret_key.encode("utf-8"), hashed_key.encode("utf-8"))
+        )
+
+
+    def needs_rehash(self, hashed_key):
+        """True if a hash was made with a different cost than the configured rounds"""
+        return hash_rounds(hashed_key) != self.rounds
+
+
+def hash_secret_with_rounds(secret_key, rounds):
+    """Hash a secret key at a given cost; module-level so process pools can run it"""
+    return bcrypt.hashpw(secret_key.encode("utf-8"), bcrypt.gensalt(rounds)).decode("utf-8")
+
+
+def hash_rounds(hashed_key):
+    """Cost factor encoded in a bcrypt hash ("$2b$<rounds>$..."), or None if unparseable"""
+    try:
+        return int(hashed_key.split("$")[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+def calibrate_rounds(target_ms, min_rounds=10, max_rounds=16, samples=3):
+    """Benchmark bcrypt on this host and pick the highest cost within target_ms
+
+    Returns (rounds, timings) where timings maps each tried cost to its median
+    milliseconds. Never goes below min_rounds even if that misses the target.
+    """
+    timings = {}
+    rounds = min_rounds
+    for cost in range(min_rounds, max_rounds + 1):
+        salt = bcrypt.gensalt(cost)
+        durations = []
+        for _ in range(samples):
+            start = time.perf_counter()
+            bcrypt.hashpw(b"calibration-secret", salt)
+            durations.append((time.perf_counter() - start) * 1000)
+        timings[cost] = statistics.median(durations)
+        if timings[cost] > target_ms:
+            break
+        rounds = cost
+    return rounds, timings
+
+
+crypto_pool = CryptoPool()
+
+
+def crypto_busy_response():
+    """503 response telling the client when to retry a rejected key operation"""
+    response = jsonify({"error": "Server busy, please try again"})
+    response.status_code = 503
+    response.headers["Retry-After"] = str(crypto_pool.retry_after)
+    return response
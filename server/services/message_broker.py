@@ -0,0 +1,113 @@
+import queue
+import threading
+import time
+from collections import defaultdict
+
+
+class InMemoryBroker:
+    """Fans new messages out to the stream subscribers of this process"""
+
+    # Messages published by other worker processes never reach this broker
+    cross_process = False
+
+    def __init__(self, max_queue_size=100):
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+        self.max_queue_size = max_queue_size
+
+    def subscribe(self, user_id):
+        """Register a subscriber queue that receives messages to or from user_id"""
+        subscription = queue.Queue(maxsize=self.max_queue_size)
+        with self._lock:
+            self._subscribers[str(user_id)].add(subscription)
+        return subscription
+
+    def unsubscribe(self, user_id, subscription):
+        """Remove a subscriber queue registered with subscribe()"""
+        with self._lock:
+            subscribers = self._subscribers.get(str(user_id))
+            if subscribers is None:
+                return
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[str(user_id)]
+
+    def subscriber_count(self):
+        """Number of open subscriptions in this process"""
+        with self._lock:
+            return sum(len(subs) for subs in self._subscribers.values())
+
+    def publish(self, message):
+        """Called after a message is written"""
+        self._dispatch(message)
+
+    def _dispatch(self, message):
+        user_ids = {str(message["senderId"]), str(message["receiverId"])}
+        with self._lock:
+            targets = [
+                subscription
+                for user_id in user_ids
+                for subscription in self._subscribers.get(user_id, ())
+            ]
+        for subscription in targets:
+            try:
+                subscription.put_nowait(message)
+            except queue.Full:
+                # A stalled client only loses pushes; it catches up by polling
+                pass
+
+
+class ChangeStreamBroker(InMemoryBroker):
+    """Broker for multiple workers: every process tails the messages change stream
+
+    Requires a replica set (MongoDB Atlas is one). publish() is a no-op because
+    inserts made by any worker reach every process through the change stream.
+    """
+
+    cross_process = True
+
+    def __init__(self, get_collection, max_queue_size=100, retry_delay=2.0):
+        super().__init__(max_queue_size)
+        # Resolved in the watcher thread so it uses the worker's own client
+        self.get_collection = get_collection
+        self.retry_delay = retry_delay
+        self._watcher = None
+        self._watcher_lock = threading.Lock()
+
+    def subscribe(self, user_id):
+        self._ensure_watcher()
+        return super().subscribe(user_id)
+
+    def publish(self, message):
+        pass
+
+    def _ensure_watcher(self):
+        # Started lazily so the thread is created in the worker, not a preloaded parent
+        with self._watcher_lock:
+            if self._watcher is None or not self._watcher.is_alive():
+                self._watcher = threading.Thread(
+                    target=self._watch, name="message-change-stream", daemon=True
+                )
+                self._watcher.start()
+
+    def _watch(self):
+        resume_token = None
+        while True:
+            try:
+                with self.get_collection().watch(
+                    [{"$match": {"operationType": "insert"}}],
+                    resume_after=resume_token,
+                ) as stream:
+                    for change in stream:
+                        resume_token = stream.resume_token
+                        self._dispatch(change["fullDocument"])
+            except Exception as error:
+                print(f"Message change stream error: {error}")
+                time.sleep(self.retry_delay)
+
+
+def create_broker(kind, mongo):
+    """Build the broker selected by the MESSAGE_BROKER setting"""
+    if kind == "changestream":
+        return ChangeStreamBroker(lambda: mongo.db.messages)
+    return InMemoryBroker()
@@ -0,0 +1,219 @@
+import math
+import os
+import threading
+import time
+from flask import jsonify, request
+from pymongo import MongoClient, monitoring
+from models.indexes import ensure_indexes
+
+
+class CircuitBreaker:
+    """Tracks whether MongoDB is reachable so requests can fail fast while it isn't
+
+    The breaker opens when the driver's monitors report the database
+    unreachable. While open, a background thread pings it with exponential
+    backoff and closes the breaker on the first success; the driver's own
+    monitors closing it first (a writable server reappearing) works too.
+    """
+
+    def __init__(self, probe, base_delay=0.5, max_delay=30.0, on_close=None):
+        self.probe = probe
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.on_close = on_close
+        self.state = "closed"
+        self.failures = 0
+        self.last_error = None
+        self.opened_at = None
+        self.next_probe_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return self.state == "open"
+
+    def trip(self, error):
+        """Open the breaker (if closed) and start probing for recovery"""
+        with self._lock:
+            self.last_error = str(error)
+            if self.state == "open":
+                return
+            self.state = "open"
+            self.opened_at = time.time()
+            self.next_probe_at = time.monotonic() + self.base_delay
+        print(f"❌ MongoDB unreachable, failing fast until it recovers: {error}")
+        threading.Thread(target=self._probe_until_closed, name="mongo-reconnect", daemon=True).start()
+
+    def reset(self):
+        """Close the breaker after the database answered"""
+        with self._lock:
+            if self.state == "closed":
+                return
+            self.state = "closed"
+            self.failures = 0
+            self.last_error = None
+            self.opened_at = None
+            self.next_probe_at = None
+        print("✅ Reconnected to MongoDB")
+        if self.on_close:
+            self.on_close()
+
+    def _probe_until_closed(self):
+        delay = self.base_delay
+        while self.is_open:
+            time.sleep(delay)
+            if not self.is_open:
+                return
+            try:
+                self.probe()
+            except Exception as error:
+                delay = min(delay * 2, self.max_delay)
+                with self._lock:
+                    self.failures += 1
+                    self.last_error = str(error)
+                    self.next_probe_at = time.monotonic() + delay
+                continue
+            self.reset()
+
+    def retry_after(self):
+        """Whole seconds until the next reconnect attempt (at least 1)"""
+        next_probe_at = self.next_probe_at
+        if next_probe_at is None:
+            return 1
+        return max(1, math.ceil(next_probe_at - time.monotonic()))
+
+    def status(self):
+        status = {"state": self.state, "failures": self.failures}
+        if self.is_open:
+            status["openedAt"] = self.opened_at
+            status["retryAfter"] = self.retry_after()
+            status["lastError"] = self.last_error
+        return status
+
+
+class _TopologyMonitor(monitoring.TopologyListener):
+    """Feeds the driver's view of the deployment into the circuit breaker"""
+
+    def __init__(self, breaker):
+        self.breaker = breaker
+
+    def opened(self, event):
+        pass
+
+    def closed(self, event):
+        pass
+
+    def description_changed(self, event):
+        description = event.new_description
+        if description.has_writable_server():
+            self.breaker.reset()
+            return
+        errors = [
+            server.error
+            for server in description.server_descriptions().values()
+            if server.error is not None
+        ]
+        if errors:
+            self.breaker.trip(errors[0])
+
+
+class MongoConnection:
+    """This process's MongoClient, created on first use, plus its circuit breaker
+
+    PyMongo clients must not be shared across fork(), so nothing connects at
+    import or in create_app(): a gunicorn --preload parent never opens a
+    socket, and each worker builds its own client (connect=False, so even that
+    returns immediately) the first time it serves a request.
+    """
+
+    def __init__(self, uri, reconnect_base_delay=0.5, reconnect_max_delay=30.0, **client_options):
+        self.uri = uri
+        self.client_options = client_options
+        self.reconnect_base_delay = reconnect_base_delay
+        self.reconnect_max_delay = reconnect_max_delay
+        self.breaker = None
+        self._client = None
+        self._db = None
+        self._pid = None
+        self._indexes_ready = False
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        self._ensure_client()
+        return self._client
+
+    @property
+    def db(self):
+        self._ensure_client()
+        return self._db
+
+    def _ensure_client(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # A client or breaker inherited from a parent process is abandoned,
+            # not closed: its sockets and threads belong to the parent
+            self.breaker = CircuitBreaker(
+                self._ping,
+                base_delay=self.reconnect_base_delay,
+                max_delay=self.reconnect_max_delay,
+                on_close=self._start_index_build,
+            )
+            self._indexes_ready = False
+            self._client = MongoClient(
+                self.uri,
+                connect=False,
+                event_listeners=[_TopologyMonitor(self.breaker)],
+                **self.client_options,
+            )
+            self._db = self._client.get_database()
+            self._pid = os.getpid()
+        self._start_index_build()
+
+    def _ping(self):
+        self._client.admin.command("ping")
+
+    def _start_index_build(self):
+        if not self._indexes_ready:
+            threading.Thread(target=self._ensure_indexes, name="mongo-ensure-indexes", daemon=True).start()
+
+    def _ensure_indexes(self):
+        try:
+            self._ping()
+        except Exception as error:
+            # The breaker is open now; indexes are built when it closes
+            self.breaker.trip(error)
+            return
+        self._indexes_ready = True
+        print("✅ Connected to MongoDB")
+        for collection_name, index_name, index_error in ensure_indexes(self._db):
+            print(f"⚠️  Could not create index {collection_name}.{index_name}: {index_error}")
+
+    def unavailable_response(self):
+        response = jsonify({"error": "Database unavailable, please try again shortly"})
+        response.status_code = 503
+        response.headers["Retry-After"] = str(self.breaker.retry_after())
+        return response
+
+    def init_app(self, app):
+        """Point app.config["MONGO_DB"] at this process's database before each
+        request, and answer API requests with an immediate 503 while the
+        breaker is open instead of letting them wait out driver timeouts"""
+        app.extensions["mongo"] = self
+
+        @app.before_request
+        def bind_database():
+            if app.config.get("MONGO_PID") != os.getpid():
+                app.config["MONGO_CLIENT"] = self.client
+                app.config["MONGO_DB"] = self.db
+                app.config["MONGO_PID"] = os.getpid()
+            if (
+                self.breaker is not None
+                and self.breaker.is_open
+                and request.path.startswith("/api/")
+                and request.path != "/api/health"
+            ):
+                return self.unavailable_response()
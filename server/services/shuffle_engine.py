@@ -0,0 +1,201 @@
+import random
+from collections import deque
+from models.user import User
+from models.assignment import Assignment
+
+
+def random_derangement(n, rng=random):
+    """Uniformly random derangement of range(n): a permutation with no fixed points
+
+    Martínez, Panholzer and Prodinger's algorithm ("Generating random
+    derangements", 2008). It runs in expected linear time and, unlike
+    shuffling until no one draws themselves, never restarts: the only
+    resampling is picking an unmarked swap partner, which takes O(1)
+    expected tries. Returns a list where result[i] != i.
+    """
+    if n < 2:
+        raise ValueError("Need at least 2 elements for a derangement")
+
+    # d[k] = D(k) / k! = sum of (-1)^i / i! for i <= k, where D(k) counts the
+    # derangements of k items; ratios keep the marking probability a float
+    d = [1.0]
+    term = 1.0
+    for k in range(1, n + 1):
+        term /= -k
+        d.append(d[k - 1] + term)
+
+    result = list(range(n))
+    marked = [False] * n
+    i = n - 1
+    unmarked = n
+    while unmarked >= 2:
+        if not marked[i]:
+            j = rng.randrange(i)
+            while marked[j]:
+                j = rng.randrange(i)
+            result[i], result[j] = result[j], result[i]
+            # Probability that i and j close a 2-cycle: (u-1) D(u-2) / D(u)
+            if rng.random() < d[unmarked - 2] / (unmarked * d[unmarked]):
+                marked[j] = True
+                unmarked -= 1
+            unmarked -= 1
+        i -= 1
+    return result
+
+
+def constrained_assignment(n, excluded, rng=random):
+    """Random assignment of n givers to n receivers avoiding self and excluded pairs
+
+    excluded[i] is the set of receiver indices giver i must not draw. Starts
+    from a uniform random derangement, frees the givers whose draw is
+    excluded, then re-seats each one along an augmenting path (Kuhn's
+    bipartite matching with breadth-first search). Each augmentation is
+    O(n^2) in the worst case and usually touches only a few givers, so the
+    runtime stays polynomial however many rules there are, unlike reshuffling
+    until a valid arrangement turns up. Returns result with result[i] the
+    receiver of giver i, or raises ValueError if the rules leave no valid
+    assignment.
+    """
+    def allowed(giver, receiver):
+        return giver != receiver and receiver not in excluded[giver]
+
+    receiver_of = random_derangement(n, rng)
+    giver_of = [None] * n
+    free_givers = []
+    for giver, receiver in enumerate(receiver_of):
+        if allowed(giver, receiver):
+            giver_of[receiver] = giver
+        else:
+            receiver_of[giver] = None
+            free_givers.append(giver)
+    if not free_givers:
+        return receiver_of
+
+    free_receivers = {r for r in range(n) if giver_of[r] is None}
+    # Receivers are scanned in one random order per run for randomized tie-breaking
+    scan_order = list(range(n))
+    rng.shuffle(scan_order)
+    rng.shuffle(free_givers)
+
+    for root in free_givers:
+        reached_from = {}
+        seen_givers = {root}
+        queue = deque([root])
+        end = None
+        while queue and end is None:
+            giver = queue.popleft()
+            # An unmatched receiver ends the path right away
+            for receiver in free_receivers:
+                if allowed(giver, receiver):
+                    reached_from[receiver] = giver
+                    end = receiver
+                    break
+            if end is not None:
+                break
+            for receiver in scan_order:
+                if receiver in reached_from or not allowed(giver, receiver):
+                    continue
+                reached_from[receiver] = giver
+                holder = giver_of[receiver]
+                if holder not in seen_givers:
+                    seen_givers.add(holder)
+                    queue.append(holder)
+
+        if end is None:
+            raise ValueError("No assignment satisfies the exclusion rules")
+
+        # Flip the path: each giver on it takes the receiver it reached
+        free_receivers.discard(end)
+        receiver = end
+        while True:
+            giver = reached_from[receiver]
+            previous = receiver_of[giver]
+            receiver_of[giver] = receiver
+            giver_of[receiver] = giver
+            if previous is None:
+                break
+            receiver = previous
+
+    return receiver_of
+
+
+def build_exclusions(users, rules, previous=None):
+    """Turn shuffle rules into per-giver sets of excluded receiver indices
+
+    rules may contain:
+      households: lists of names who must not draw each other
+      exclusions: [giver, receiver] name pairs that must not be drawn
+      avoidPrevious: if true, nobody draws their current assignment again
+    previous maps giver ids to their current receiver ids (for avoidPrevious).
+    Raises ValueError for malformed rules or unknown names.
+    """
+    index_of = {user["name"]: i for i, user in enumerate(users)}
+    excluded = [set() for _ in users]
+
+    def lookup(name):
+        if not isinstance(name, str):
+            raise ValueError(f"Names in shuffle rules must be strings: {name!r}")
+        if name not in index_of:
+            raise ValueError(f"Unknown user in shuffle rules: {name}")
+        return index_of[name]
+
+    households = rules.get("households") or []
+    exclusions = rules.get("exclusions") or []
+    if not isinstance(households, list):
+        raise ValueError("households must be a list of name lists")
+    if not isinstance(exclusions, list):
+        raise ValueError("exclusions must be a list of [giver, receiver] pairs")
+
+    for household in households:
+        if not isinstance(household, list):
+            raise ValueError("households must be a list of name lists")
+        members = [lookup(name) for name in household]
+        for giver in members:
+            excluded[giver].update(m for m in members if m != giver)
+
+    for pair in exclusions:
+        if not isinstance(pair, list) or len(pair) != 2:
+            raise ValueError("exclusions must be a list of [giver, receiver] pairs")
+        excluded[lookup(pair[0])].add(lookup(pair[1]))
+
+    if rules.get("avoidPrevious") and previous:
+        index_of_id = {str(user["_id"]): i for i, user in enumerate(users)}
+        for giver, user in enumerate(users):
+            receiver = index_of_id.get(previous.get(str(user["_id"])))
+            if receiver is not None:
+                excluded[giver].add(receiver)
+
+    return excluded
+
+
+def shuffle_assignments(db, rules=None, rng=random):
+    """Assign every user a random recipient other than themselves
+
+    rules are optional exclusion rules (see build_exclusions). The complete
+    set is written as a new generation and activated with one pointer
+    write, so readers never see a half-applied shuffle, and everyone's
+    seen flag resets with the new generation. Returns a list of
+    {"name", "assignedTo"} pairs, or raises ValueError for fewer than 2
+    users, invalid rules, rules no assignment can satisfy, or when an
+    overlapping shuffle was activated first.
+    """
+    user_model = User(db)
+    assignment = Assignment(db)
+    users = user_model.find_roster()
+    if len(users) < 2:
+        raise ValueError("Need at least 2 users to shuffle")
+
+    if rules:
+        excluded = build_exclusions(users, rules, assignment.active_set()["receiver_of"])
+        targets = constrained_assignment(len(users), excluded, rng)
+    else:
+        targets = random_derangement(len(users), rng)
+    pairs = [(users[i]["_id"], users[targets[i]]["_id"]) for i in range(len(users))]
+    # Also invalidates assignment claims in previously issued tokens
+    if assignment.publish(pairs) is None:
+        raise ValueError("Another shuffle finished first; its assignments are active")
+
+    return [
+        {"name": users[i]["name"], "assignedTo": users[targets[i]]["name"]}
+        for i in range(len(users))
+    ]
@@ -0,0 +1,125 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+from flask import Response, request, send_file
+
+try:
+    import brotli
+except ImportError:  # optional: without it only gzip variants are built
+    brotli = None
+
+# Vite content-hashes everything under assets/, so those URLs never change
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+# index.html names the current hashed bundles; browsers recheck it often and get 304s
+INDEX_CACHE = "public, max-age=60, must-revalidate"
+DEFAULT_CACHE = "public, max-age=3600"
+
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/javascript",
+    "application/json",
+    "application/xml",
+    "application/wasm",
+    "image/svg+xml",
+)
+MIN_COMPRESS_BYTES = 1024
+
+
+class StaticAsset:
+    def __init__(self, path, relative_path, body=None):
+        self.path = path
+        self.mimetype = mimetypes.guess_type(relative_path)[0] or "application/octet-stream"
+        if relative_path == "index.html":
+            self.cache_control = INDEX_CACHE
+        elif relative_path.startswith("assets/"):
+            self.cache_control = IMMUTABLE_CACHE
+        else:
+            self.cache_control = DEFAULT_CACHE
+        # encoding -> (body, etag); "identity" is the uncompressed file. Files too
+        # large to keep in memory have no variants and are streamed from disk.
+        self.variants = {}
+        if body is not None:
+            digest = hashlib.sha256(body).hexdigest()[:20]
+            self.variants["identity"] = (body, digest)
+            if self.mimetype.startswith(COMPRESSIBLE_TYPES) and len(body) >= MIN_COMPRESS_BYTES:
+                self._add_variant("gzip", path + ".gz", lambda: gzip.compress(body, 9, mtime=0), digest)
+                if brotli is not None or os.path.exists(path + ".br"):
+                    self._add_variant("br", path + ".br", lambda: brotli.compress(body), digest)
+
+    def _add_variant(self, encoding, precompressed_path, compress, digest):
+        # Prefer a variant produced by the build, if there is one
+        if os.path.exists(precompressed_path):
+            with open(precompressed_path, "rb") as f:
+                compressed = f.read()
+        else:
+            compressed = compress()
+        if len(compressed) < len(self.variants["identity"][0]):
+            self.variants[encoding] = (compressed, f"{digest}-{encoding}")
+
+    def response(self):
+        if not self.variants:
+            response = send_file(self.path, mimetype=self.mimetype, conditional=True, etag=True)
+            response.headers["Cache-Control"] = self.cache_control
+            return response
+
+        encoding = "identity"
+        for candidate in ("br", "gzip"):
+            if candidate in self.variants and request.accept_encodings[candidate]:
+                encoding = candidate
+                break
+        body, etag = self.variants[encoding]
+
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            response = Response(body, mimetype=self.mimetype)
+            if encoding != "identity":
+                response.headers["Content-Encoding"] = encoding
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = self.cache_control
+        if len(self.variants) > 1:
+            response.headers["Vary"] = "Accept-Encoding"
+        return response
+
+
+class StaticAssets:
+    """In-memory index of the built frontend (dist/), made once at startup
+
+    Requests for the SPA are answered from memory: no stat() or open() per
+    request, precompressed gzip/brotli bodies, strong ETags and long-lived
+    caching for Vite's hashed assets. Files above max_file_bytes are only
+    indexed and streamed from disk.
+    """
+
+    def __init__(self, root, max_file_bytes=2 * 1024 * 1024):
+        self.root = root
+        self.max_file_bytes = max_file_bytes
+        self.assets = {}
+
+    def load(self):
+        assets = {}
+        if os.path.isdir(self.root):
+            for directory, _, filenames in os.walk(self.root):
+                for filename in filenames:
+                    if filename.endswith((".gz", ".br")) and os.path.exists(
+                        os.path.join(directory, filename[:-3])
+                    ):
+                        # A build-time variant of another file, used through it
+                        continue
+                    path = os.path.join(directory, filename)
+                    relative_path = os.path.relpath(path, self.root).replace(os.sep, "/")
+                    body = None
+                    if os.path.getsize(path) <= self.max_file_bytes:
+                        with open(path, "rb") as f:
+                            body = f.read()
+                    assets[relative_path] = StaticAsset(path, relative_path, body)
+        self.assets = assets
+        return self
+
+    def get(self, path):
+        return self.assets.get(path)
+
+    @property
+    def index(self):
+        return self.assets.get("index.html")
@@ -0,0 +1,123 @@
+import csv
+import json
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from models.user import User, lookup_tag
+from services.crypto_pool import crypto_pool, hash_secret_with_rounds
+
+FORMATS = {
+    "text/csv": "csv",
+    "application/x-ndjson": "ndjson",
+    "application/ndjson": "ndjson",
+}
+
+
+def read_rows(stream, fmt):
+    """Yield user rows ({"name", "secretKey"}) lazily from a text stream
+
+    fmt is "csv" (header row with name and optional secretKey columns) or
+    "ndjson" (one JSON object per line). Unparseable lines are yielded as
+    None so they are reported as invalid rows without stopping the import.
+    """
+    if fmt == "csv":
+        for row in csv.DictReader(stream):
+            yield {"name": row.get("name"), "secretKey": row.get("secretKey") or None}
+    elif fmt == "ndjson":
+        for line in stream:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                yield None
+    else:
+        raise ValueError(f"Unsupported import format: {fmt}")
+
+
+def _batches(rows, batch_size):
+    batch = []
+    for row_number, row in enumerate(rows, start=1):
+        batch.append((row_number, row))
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def import_users(db, rows, batch_size=1000, processes=0):
+    """Create users from an iterable of rows in batches
+
+    Per batch: one $in query for names that already exist, bcrypt for the
+    provided keys spread over `processes` worker processes (0 hashes on all
+    workers of the shared crypto pool instead), and one insert_many(ordered=False). Rows may
+    come from a stream, so imports of any size use bounded memory. Returns
+    {"created": [{"name", "id"}], "errors": [{"row", "name", "error"}]}.
+    """
+    user_model = User(db)
+    created, errors = [], []
+    seen_names = set()
+    executor = None
+
+    def hash_keys(keys):
+        nonlocal executor
+        if not keys:
+            return []
+        if processes <= 0:
+            return crypto_pool.hash_secrets(keys)
+        if executor is None:
+            # spawn: forking a threaded web worker is unsafe
+            executor = ProcessPoolExecutor(
+                max_workers=processes, mp_context=multiprocessing.get_context("spawn")
+            )
+        chunksize = max(1, len(keys) // (processes * 4))
+        return list(executor.map(
+            hash_secret_with_rounds, keys, [crypto_pool.rounds] * len(keys), chunksize=chunksize
+        ))
+
+    try:
+        for batch in _batches(rows, batch_size):
+            candidates = []
+            for row_number, row in batch:
+                if not isinstance(row, dict):
+                    errors.append({"row": row_number, "name": "Unknown", "error": "Invalid row"})
+                    continue
+                name = row.get("name")
+                name = name.strip() if isinstance(name, str) else ""
+                if not name:
+                    errors.append({"row": row_number, "name": "Unknown", "error": "Name is required"})
+                    continue
+                if name in seen_names:
+                    errors.append({"row": row_number, "name": name, "error": "Duplicate name in import"})
+                    continue
+                secret_key = row.get("secretKey")
+                if secret_key is not None and not isinstance(secret_key, str):
+                    errors.append({"row": row_number, "name": name, "error": "Secret key must be a string"})
+                    continue
+                seen_names.add(name)
+                candidates.append((row_number, name, secret_key or None))
+
+            existing = user_model.find_existing_names([name for _, name, _ in candidates])
+            for row_number, name, _ in candidates:
+                if name in existing:
+                    errors.append({"row": row_number, "name": name, "error": "User already exists"})
+            candidates = [c for c in candidates if c[1] not in existing]
+
+            hashes = iter(hash_keys([key for _, _, key in candidates if key]))
+            documents = [
+                user_model.new_document(name, next(hashes), lookup_tag(key))
+                if key else user_model.new_document(name)
+                for _, name, key in candidates
+            ]
+
+            inserted, failures = user_model.create_many(documents)
+            for index, message in failures.items():
+                row_number, name, _ = candidates[index]
+                errors.append({"row": row_number, "name": name, "error": message})
+            created.extend({"name": user["name"], "id": str(user["_id"])} for user in inserted)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    return {"created": created, "errors": errors}
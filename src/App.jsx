@@ -8,11 +8,12 @@ import UpdateKey from "./components/UpdateKey";
 import Login from "./components/Login";
 import WaitingPage from "./components/WaitingPage";
 import Dashboard from "./components/Dashboard";
-import { verifyToken } from "./utils/api";
+import { getDashboard, verifyToken } from "./utils/api";
 
 // Protected Route component for Dashboard
 function ProtectedDashboard() {
   const [user, setUser] = useState(null);
+  const [dashboard, setDashboard] = useState(null);
   const [loading, setLoading] = useState(true);
 
   useEffect(() => {
@@ -20,8 +21,10 @@ function ProtectedDashboard() {
     const savedUser = localStorage.getItem("user");
 
     if (token && savedUser) {
-      verifyToken()
+      // Verifies the token and loads the dashboard data in one request
+      getDashboard()
         .then((data) => {
+          setDashboard(data);
           setUser(JSON.parse(savedUser));
         })
         .catch(() => {
@@ -60,7 +63,9 @@ function ProtectedDashboard() {
     window.location.href = "/";
   };
 
-  return <Dashboard user={user} onLogout={handleLogout} />;
+  return (
+    <Dashboard user={user} initialData={dashboard} onLogout={handleLogout} />
+  );
 }
 
 // Protected Route component for Waiting Page
@@ -8,10 +8,12 @@ import {
   getSantaConversation,
   sendMessageToAssignment,
   sendMessageToSanta,
+  streamMessages,
+  markConversationRead,
 } from "../utils/api";
 import DrumrollAnimation from "./DrumrollAnimation";
 
-export default function Dashboard({ user, onLogout }) {
+export default function Dashboard({ user, initialData, onLogout }) {
   const [assignment, setAssignment] = useState(null);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState("");
@@ -30,6 +32,16 @@ export default function Dashboard({ user, onLogout }) {
   const [sendingSantaMessage, setSendingSantaMessage] = useState(false);
   const assignmentChatRef = useRef(null);
   const santaChatRef = useRef(null);
+  // Cursors returned by the server so polls only fetch newer messages
+  const assignmentCursorRef = useRef(null);
+  const santaCursorRef = useRef(null);
+  // Cursors for loading older pages when scrolled to the top (null = no more)
+  const assignmentOlderRef = useRef(null);
+  const santaOlderRef = useRef(null);
+  const loadedInitialPageRef = useRef(false);
+  const loadingOlderRef = useRef(false);
+  // Set while prepending an older page so the chat keeps its scroll position
+  const preserveScrollRef = useRef(null);
 
   useEffect(() => {
     loadData();
@@ -37,35 +49,113 @@ export default function Dashboard({ user, onLogout }) {
 
   // Load chat messages when assignment is available
   useEffect(() => {
-    if (assignment?.assigned && animationComplete) {
-      loadChatMessages();
-      // Poll for new messages every 3 seconds
-      const interval = setInterval(loadChatMessages, 3000);
-      return () => clearInterval(interval);
-    }
+    if (!(assignment?.assigned && animationComplete)) return;
+
+    const controller = new AbortController();
+    let pollInterval = null;
+    let retryTimeout = null;
+
+    // Poll every 3 seconds while the push stream is down, and every 30 seconds
+    // while it is up in case a push was missed (e.g. sent through another worker)
+    const startPolling = (interval = 3000) => {
+      clearInterval(pollInterval);
+      pollInterval = setInterval(loadChatMessages, interval);
+    };
+    const stopPolling = () => {
+      clearInterval(pollInterval);
+      pollInterval = null;
+    };
+
+    const connect = async () => {
+      let retryDelay = 3000;
+      try {
+        await streamMessages((event) => {
+          if (event.type === "ready") {
+            startPolling(30000);
+          }
+          // Catch up after (re)connecting, and fetch whatever was just pushed
+          loadChatMessages();
+        }, controller.signal);
+      } catch (err) {
+        if (controller.signal.aborted) return;
+        // 501: this deployment can't stream, so stay on polling
+        if (err.status === 501) {
+          startPolling();
+          return;
+        }
+        if (err.status === 503) retryDelay = Math.max(err.retryAfter, 30) * 1000;
+      }
+      if (controller.signal.aborted) return;
+      startPolling();
+      retryTimeout = setTimeout(connect, retryDelay);
+    };
+
+    loadChatMessages();
+    startPolling();
+    connect();
+
+    return () => {
+      controller.abort();
+      stopPolling();
+      clearTimeout(retryTimeout);
+    };
   }, [assignment?.assigned, animationComplete]);
 
-  // Auto-scroll chat to bottom when new messages arrive
-  useEffect(() => {
-    if (assignmentChatRef.current) {
-      assignmentChatRef.current.scrollTop =
-        assignmentChatRef.current.scrollHeight;
+  // Auto-scroll chat to bottom when new messages arrive, or keep the
+  // position steady when an older page was prepended
+  const scrollChat = (chatRef) => {
+    const chat = chatRef.current;
+    if (!chat) return;
+    const preserved = preserveScrollRef.current;
+    if (preserved && preserved.chat === chat) {
+      chat.scrollTop = chat.scrollHeight - preserved.fromBottom;
+      preserveScrollRef.current = null;
+    } else {
+      chat.scrollTop = chat.scrollHeight;
     }
+  };
+
+  useEffect(() => {
+    scrollChat(assignmentChatRef);
   }, [assignmentMessages]);
 
   useEffect(() => {
-    if (santaChatRef.current) {
-      santaChatRef.current.scrollTop = santaChatRef.current.scrollHeight;
-    }
+    scrollChat(santaChatRef);
   }, [santaMessages]);
 
+  // Start both chats from the conversation heads returned by /api/dashboard
+  const seedConversations = (conversations) => {
+    const assignmentConv = conversations?.assignment;
+    const santaConv = conversations?.santa;
+    if (!assignmentConv || !santaConv) return;
+    assignmentCursorRef.current = assignmentConv.cursor || null;
+    santaCursorRef.current = santaConv.cursor || null;
+    assignmentOlderRef.current = assignmentConv.hasMore
+      ? assignmentConv.olderCursor
+      : null;
+    santaOlderRef.current = santaConv.hasMore ? santaConv.olderCursor : null;
+    loadedInitialPageRef.current = true;
+    setAssignmentMessages(assignmentConv.messages || []);
+    setSantaMessages(santaConv.messages || []);
+    markReadIfIncoming("assignment", assignmentConv.messages);
+    markReadIfIncoming("santa", santaConv.messages);
+  };
+
   const loadData = async () => {
     try {
       setLoading(true);
-      const [assignmentData, usersData] = await Promise.all([
-        getMyAssignment(),
-        getUsers(),
-      ]);
+      let assignmentData, usersData;
+      if (initialData) {
+        // Already loaded in one request while verifying the session
+        assignmentData = initialData.assignment;
+        usersData = initialData;
+        seedConversations(initialData.conversations);
+      } else {
+        [assignmentData, usersData] = await Promise.all([
+          getMyAssignment(),
+          getUsers(),
+        ]);
+      }
 
       setAssignment(assignmentData);
 
@@ -119,15 +209,48 @@ export default function Dashboard({ user, onLogout }) {
     }
   };
 
+  // Both chats are on screen, so incoming messages count as read once loaded
+  const markReadIfIncoming = (conversation, messages) => {
+    if (messages?.some((msg) => !msg.isFromMe)) {
+      markConversationRead(conversation).catch((err) =>
+        console.error("Failed to mark messages as read:", err)
+      );
+    }
+  };
+
+  // Append messages not already shown (a send and a poll can return the same one)
+  const mergeMessages = (prev, incoming) => {
+    if (!incoming || incoming.length === 0) return prev;
+    const seen = new Set(prev.map((msg) => msg.id));
+    const fresh = incoming.filter((msg) => !seen.has(msg.id));
+    return fresh.length === 0 ? prev : [...prev, ...fresh];
+  };
+
   const loadChatMessages = async () => {
     try {
       if (assignment?.assigned) {
         const [assignmentConv, santaConv] = await Promise.all([
-          getAssignmentConversation(),
-          getSantaConversation(),
+          getAssignmentConversation({ since: assignmentCursorRef.current }),
+          getSantaConversation({ since: santaCursorRef.current }),
         ]);
-        setAssignmentMessages(assignmentConv.messages || []);
-        setSantaMessages(santaConv.messages || []);
+        assignmentCursorRef.current = assignmentConv.cursor || null;
+        santaCursorRef.current = santaConv.cursor || null;
+        if (!loadedInitialPageRef.current) {
+          // The first response is the newest page; remember where older ones start
+          loadedInitialPageRef.current = true;
+          assignmentOlderRef.current = assignmentConv.hasMore
+            ? assignmentConv.olderCursor
+            : null;
+          santaOlderRef.current = santaConv.hasMore
+            ? santaConv.olderCursor
+            : null;
+        }
+        setAssignmentMessages((prev) =>
+          mergeMessages(prev, assignmentConv.messages)
+        );
+        setSantaMessages((prev) => mergeMessages(prev, santaConv.messages));
+        markReadIfIncoming("assignment", assignmentConv.messages);
+        markReadIfIncoming("santa", santaConv.messages);
       }
     } catch (err) {
       // Silently fail - don't show errors for chat polling
@@ -135,6 +258,33 @@ export default function Dashboard({ user, onLogout }) {
     }
   };
 
+  // Load the previous page of a conversation when its chat is scrolled to the top
+  const loadOlderMessages = async (chatRef, olderRef, fetchPage, setMessages) => {
+    const chat = chatRef.current;
+    if (!chat || chat.scrollTop > 0 || !olderRef.current) return;
+    if (loadingOlderRef.current) return;
+
+    try {
+      loadingOlderRef.current = true;
+      const page = await fetchPage({ before: olderRef.current });
+      olderRef.current = page.hasMore ? page.olderCursor : null;
+      if (page.messages?.length) {
+        preserveScrollRef.current = {
+          chat,
+          fromBottom: chat.scrollHeight - chat.scrollTop,
+        };
+        setMessages((prev) => {
+          const seen = new Set(prev.map((msg) => msg.id));
+          return [...page.messages.filter((msg) => !seen.has(msg.id)), ...prev];
+        });
+      }
+    } catch (err) {
+      console.error("Failed to load older messages:", err);
+    } finally {
+      loadingOlderRef.current = false;
+    }
+  };
+
   const handleSendAssignmentMessage = async () => {
     const trimmed = assignmentMessageInput.trim();
     if (!trimmed || sendingAssignmentMessage) return;
@@ -142,7 +292,7 @@ export default function Dashboard({ user, onLogout }) {
     try {
       setSendingAssignmentMessage(true);
       const result = await sendMessageToAssignment(trimmed);
-      setAssignmentMessages((prev) => [...prev, result.message]);
+      setAssignmentMessages((prev) => mergeMessages(prev, [result.message]));
       setAssignmentMessageInput("");
       // Reload to get updated conversation
       await loadChatMessages();
@@ -160,7 +310,7 @@ export default function Dashboard({ user, onLogout }) {
     try {
       setSendingSantaMessage(true);
       const result = await sendMessageToSanta(trimmed);
-      setSantaMessages((prev) => [...prev, result.message]);
+      setSantaMessages((prev) => mergeMessages(prev, [result.message]));
       setSantaMessageInput("");
       // Reload to get updated conversation
       await loadChatMessages();
@@ -307,6 +457,14 @@ export default function Dashboard({ user, onLogout }) {
               {/* Messages */}
               <div
                 ref={assignmentChatRef}
+                onScroll={() =>
+                  loadOlderMessages(
+                    assignmentChatRef,
+                    assignmentOlderRef,
+                    getAssignmentConversation,
+                    setAssignmentMessages
+                  )
+                }
                 className="flex-1 overflow-y-auto mb-4 space-y-3 pr-2"
               >
                 {assignmentMessages.length === 0 ? (
@@ -397,6 +555,14 @@ export default function Dashboard({ user, onLogout }) {
               {/* Messages */}
               <div
                 ref={santaChatRef}
+                onScroll={() =>
+                  loadOlderMessages(
+                    santaChatRef,
+                    santaOlderRef,
+                    getSantaConversation,
+                    setSantaMessages
+                  )
+                }
                 className="flex-1 overflow-y-auto mb-4 space-y-3 pr-2"
               >
                 {santaMessages.length === 0 ? (
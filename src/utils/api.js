@@ -132,7 +132,22 @@ export const setUserKey = async (name, secretKey, currentKey = null) => {
 };
 
 export const verifyToken = async () => {
-  return authFetch("/auth/verify");
+  const data = await authFetch("/auth/verify");
+  // The server reissues the token when assignments changed since it was issued
+  if (data?.token) {
+    localStorage.setItem("token", data.token);
+  }
+  return data;
+};
+
+// Everything the dashboard needs for first paint in one request: the user,
+// their assignment, all names, and the newest page of both conversations
+export const getDashboard = async () => {
+  const data = await authFetch("/dashboard");
+  if (data?.token) {
+    localStorage.setItem("token", data.token);
+  }
+  return data;
 };
 
 // Assignment API
@@ -147,12 +162,22 @@ export const markAssignmentSeen = async () => {
 };
 
 // Message API
-export const getAssignmentConversation = async () => {
-  return authFetch("/messages/conversation/assignment");
+// Conversation paging: pass `since` (a previous `cursor`) to fetch only newer
+// messages, or `before` (a previous `olderCursor`) to load an older page
+const withPage = (url, { since, before } = {}) => {
+  const params = new URLSearchParams();
+  if (since) params.set("since", since);
+  if (before) params.set("before", before);
+  const query = params.toString();
+  return query ? `${url}?${query}` : url;
 };
 
-export const getSantaConversation = async () => {
-  return authFetch("/messages/conversation/santa");
+export const getAssignmentConversation = async (page = {}) => {
+  return authFetch(withPage("/messages/conversation/assignment", page));
+};
+
+export const getSantaConversation = async (page = {}) => {
+  return authFetch(withPage("/messages/conversation/santa", page));
 };
 
 export const sendMessageToAssignment = async (message) => {
@@ -168,3 +193,56 @@ export const sendMessageToSanta = async (message) => {
     body: JSON.stringify({ message }),
   });
 };
+
+// Unread counts and last-message previews for both conversations
+export const getMessageSummary = async () => {
+  return authFetch("/messages/summary");
+};
+
+// conversation: "assignment", "santa", or omitted for both
+export const markConversationRead = async (conversation) => {
+  return authFetch("/messages/mark-read", {
+    method: "POST",
+    body: JSON.stringify(conversation ? { conversation } : {}),
+  });
+};
+
+// Read the server-sent message stream until it closes.
+// Uses fetch instead of EventSource so the token stays in the Authorization header.
+export const streamMessages = async (onEvent, signal) => {
+  const response = await fetch(`${API_BASE}/messages/stream`, {
+    headers: { Authorization: `Bearer ${getToken()}` },
+    signal,
+  });
+
+  if (!response.ok || !response.body) {
+    const error = new Error("Message stream unavailable");
+    error.status = response.status;
+    error.retryAfter = Number(response.headers.get("Retry-After")) || 0;
+    throw error;
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) return;
+
+    buffer += decoder.decode(value, { stream: true });
+    let boundary;
+    while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+      const chunk = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      const data = chunk
+        .split("\n")
+        .filter((line) => line.startsWith("data:"))
+        .map((line) => line.slice(5).trim())
+        .join("\n");
+      if (data) {
+        onEvent(JSON.parse(data));
+      }
+    }
+  }
+};
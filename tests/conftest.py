@@ -0,0 +1,43 @@
+import os
+import sys
+
+import mongomock
+import pytest
+
+os.environ.setdefault("SECRET_KEY_LOOKUP_KEY", "test-lookup-key")
+os.environ.setdefault("JWT_SECRET", "test-jwt-secret-long-enough-for-hs256")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "server"))
+
+from app import create_app  # noqa: E402
+from models.assignment import assignment_sets  # noqa: E402
+from models.generation import shuffle_generation  # noqa: E402
+from models.user import roster_cache  # noqa: E402
+from services.crypto_pool import crypto_pool  # noqa: E402
+from services.message_broker import InMemoryBroker  # noqa: E402
+
+
+@pytest.fixture
+def db():
+    return mongomock.MongoClient().db
+
+
+@pytest.fixture
+def app(db, monkeypatch):
+    app = create_app()
+    app.config["MONGO_DB"] = db
+    # Bound to this process already, so the real client is never created
+    app.config["MONGO_PID"] = os.getpid()
+    app.config["MESSAGE_BROKER"] = InMemoryBroker()
+    crypto_pool.rounds = 4
+    # Process-wide caches would otherwise carry state between databases
+    # (generation numbers restart at 1 in every test database)
+    roster_cache.invalidate()
+    monkeypatch.setattr(assignment_sets, "_sets", {})
+    monkeypatch.setattr(shuffle_generation, "_generation", None)
+    shuffle_generation.check_interval = 0
+    return app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
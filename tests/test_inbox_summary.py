@@ -0,0 +1,23 @@
+from models.assignment import Assignment
+
+
+def login(client, name):
+    client.post(f"/api/auth/users/{name}/set-key", json={"secretKey": f"{name}-key"})
+    response = client.post("/api/auth/login", json={"name": name, "secretKey": f"{name}-key"})
+    return {"Authorization": f"Bearer {response.get_json()['token']}"}
+
+
+def test_two_cycle_unread_counts_shared_conversation_once(client, db):
+    client.post("/api/admin/init-users", json={"users": [{"name": "Ana"}, {"name": "Ben"}]})
+    ids = {user["name"]: user["_id"] for user in db.users.find()}
+    # With two users each is the other's assignee and Santa: one conversation
+    Assignment(db).publish([(ids["Ana"], ids["Ben"]), (ids["Ben"], ids["Ana"])])
+    ana, ben = login(client, "Ana"), login(client, "Ben")
+
+    for i in range(3):
+        client.post("/api/messages/send/assignment", headers=ana, json={"message": f"hi {i}"})
+    summary = client.get("/api/messages/summary", headers=ben).get_json()
+
+    assert summary["unread"] == 3
+    assert summary["conversations"]["assignment"]["unread"] == 3
+    assert summary["conversations"]["santa"]["unread"] == 3
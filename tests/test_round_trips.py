@@ -0,0 +1,91 @@
+"""Each user document is fetched at most once per request
+
+The conversation and send routes resolve the caller, their assignment and
+their Secret Santa through the token claims, the roster cache and the
+per-request identity map. These tests count the user documents every
+request reads from the users collection, so a route that looks the same
+user up twice shows up as a failure.
+"""
+
+from collections import Counter
+
+import pytest
+from mongomock.collection import Cursor
+
+from models.assignment import Assignment
+from models.user import roster_cache
+
+NAMES = ["Ana", "Ben", "Cal", "Dee"]
+
+
+@pytest.fixture
+def user_reads(monkeypatch):
+    """Counter of user _ids read from the users collection"""
+    reads = Counter()
+    next_document = Cursor.__next__
+
+    def counting_next(cursor):
+        document = next_document(cursor)
+        if cursor.collection.name == "users":
+            reads[document.get("_id")] += 1
+        return document
+
+    # find_one() is next(find()), so this sees both
+    monkeypatch.setattr(Cursor, "__next__", counting_next)
+    return reads
+
+
+@pytest.fixture(params=["uncached", "cached"])
+def roster(request, monkeypatch):
+    monkeypatch.setattr(roster_cache, "max_age", 0 if request.param == "uncached" else 60)
+
+
+@pytest.fixture
+def users(client, db):
+    client.post("/api/admin/init-users", json={"users": [{"name": name} for name in NAMES]})
+    ids = {user["name"]: user["_id"] for user in db.users.find()}
+    # A fixed ring so both conversation partners exist: Ana -> Ben -> Cal -> Dee -> Ana
+    Assignment(db).publish([(ids[a], ids[b]) for a, b in zip(NAMES, NAMES[1:] + NAMES[:1])])
+    return ids
+
+
+@pytest.fixture
+def headers(client, users):
+    client.post("/api/auth/users/Ana/set-key", json={"secretKey": "ana-key"})
+    response = client.post("/api/auth/login", json={"name": "Ana", "secretKey": "ana-key"})
+    return {"Authorization": f"Bearer {response.get_json()['token']}"}
+
+
+def republish(db):
+    """Publish the same ring as a new generation, so the token's claims go stale"""
+    active = Assignment(db).active_set()
+    Assignment(db).publish(list(active["receiver_of"].items()))
+
+
+REQUESTS = [
+    ("get", "/api/messages/conversation/assignment", None),
+    ("get", "/api/messages/conversation/santa", None),
+    ("post", "/api/messages/send/santa", {"message": "Hello Santa"}),
+]
+
+
+@pytest.mark.parametrize("stale_claims", [False, True], ids=["claims", "stale-claims"])
+@pytest.mark.parametrize("method,path,body", REQUESTS, ids=[path for _, path, _ in REQUESTS])
+def test_user_documents_read_at_most_once(
+    client, db, users, headers, roster, user_reads, method, path, body, stale_claims
+):
+    if stale_claims:
+        republish(db)
+    user_reads.clear()
+
+    response = getattr(client, method)(path, headers=headers, json=body)
+
+    assert response.status_code == 200, response.get_json()
+    repeated = {user_id: count for user_id, count in user_reads.items() if count > 1}
+    assert not repeated
+
+
+def test_conversation_reports_other_user(client, users, headers, roster):
+    response = client.get("/api/messages/conversation/santa", headers=headers)
+
+    assert response.get_json()["otherUser"]["id"] == str(users["Dee"])
@@ -0,0 +1,119 @@
+import random
+from collections import Counter
+from itertools import permutations
+
+import pytest
+
+from services.shuffle_engine import build_exclusions, constrained_assignment, random_derangement
+
+
+def derangements(n):
+    return [p for p in permutations(range(n)) if all(p[i] != i for i in range(n))]
+
+
+def satisfying(n, excluded):
+    return [p for p in derangements(n) if all(p[i] not in excluded[i] for i in range(n))]
+
+
+def assert_valid(result, excluded):
+    assert sorted(result) == list(range(len(result)))
+    for giver, receiver in enumerate(result):
+        assert receiver != giver
+        assert receiver not in excluded[giver]
+
+
+@pytest.mark.parametrize("n", [0, 1])
+def test_derangement_needs_two_elements(n):
+    with pytest.raises(ValueError):
+        random_derangement(n)
+
+
+@pytest.mark.parametrize("n", [2, 3, 7, 50])
+def test_derangement_has_no_fixed_points(n):
+    rng = random.Random(n)
+    for _ in range(200):
+        assert_valid(random_derangement(n, rng), [set()] * n)
+
+
+@pytest.mark.parametrize("n", [3, 4, 5])
+def test_derangement_is_uniform(n):
+    rng = random.Random(2024 + n)
+    expected = derangements(n)
+    samples = 300 * len(expected)
+    counts = Counter(tuple(random_derangement(n, rng)) for _ in range(samples))
+
+    assert set(counts) == set(expected)
+    mean = samples / len(expected)
+    # Chi-square against the uniform distribution; the bound is far above its
+    # degrees of freedom, so only a clearly biased generator fails
+    chi_square = sum((count - mean) ** 2 / mean for count in counts.values())
+    assert chi_square < 3 * len(expected) + 30
+
+
+def test_constrained_without_exclusions_is_a_derangement():
+    rng = random.Random(1)
+    assert_valid(constrained_assignment(6, [set() for _ in range(6)], rng), [set()] * 6)
+
+
+@pytest.mark.parametrize("n", [2, 3, 4, 5, 6])
+def test_constrained_matches_brute_force(n):
+    rng = random.Random(n)
+    for _ in range(60):
+        excluded = [
+            {r for r in range(n) if r != g and rng.random() < 0.35} for g in range(n)
+        ]
+        valid = satisfying(n, excluded)
+        if valid:
+            result = constrained_assignment(n, excluded, rng)
+            assert_valid(result, excluded)
+            assert tuple(result) in valid
+        else:
+            with pytest.raises(ValueError):
+                constrained_assignment(n, excluded, rng)
+
+
+def test_constrained_reaches_every_valid_assignment():
+    rng = random.Random(7)
+    # Ana and Ben share a household
+    excluded = [{1}, {0}, set(), set(), set()]
+    valid = set(satisfying(5, excluded))
+    seen = {tuple(constrained_assignment(5, excluded, rng)) for _ in range(3000)}
+
+    assert seen == valid
+
+
+USERS = [{"_id": i, "name": name} for i, name in enumerate(["Ana", "Ben", "Cal"])]
+
+
+def test_build_exclusions():
+    excluded = build_exclusions(
+        USERS,
+        {"households": [["Ana", "Ben"]], "exclusions": [["Cal", "Ana"]], "avoidPrevious": True},
+        previous={"1": "2"},
+    )
+
+    assert excluded == [{1}, {0, 2}, {0}]
+
+
+@pytest.mark.parametrize("rules", [
+    {"households": [[["Ana"]]]},
+    {"households": [["Ana", 5]]},
+    {"households": "Ana"},
+    {"households": ["Ana"]},
+    {"exclusions": [[["Ana"], "Ben"]]},
+    {"exclusions": [["Ana", {"name": "Ben"}]]},
+    {"exclusions": [["Ana"]]},
+    {"exclusions": 5},
+    {"exclusions": [["Ana", "Zed"]]},
+])
+def test_build_exclusions_rejects_malformed_rules(rules):
+    with pytest.raises(ValueError):
+        build_exclusions(USERS, rules)
+
+
+def test_shuffle_route_rejects_malformed_rules(client):
+    client.post("/api/admin/init-users", json={"users": [{"name": u["name"]} for u in USERS]})
+
+    response = client.post("/api/admin/shuffle", json={"households": [[["Ana"]]]})
+
+    assert response.status_code == 400
@@ -0,0 +1,25 @@
+from services.crypto_pool import crypto_pool
+from services.user_import import import_users
+
+
+def test_keys_are_hashed_on_the_crypto_pool(app, db):
+    result = import_users(
+        db,
+        [{"name": f"User {i}", "secretKey": f"key-{i}"} for i in range(5)] + [{"name": "Keyless"}],
+        batch_size=4,
+    )
+
+    assert result["errors"] == []
+    assert len(result["created"]) == 6
+    for i in range(5):
+        user = db.users.find_one({"name": f"User {i}"})
+        assert crypto_pool.check_secret(f"key-{i}", user["secretKey"])
+    assert db.users.find_one({"name": "Keyless"})["secretKey"] is None
+
+
+def test_non_string_secret_key_is_reported(app, db):
+    result = import_users(db, [{"name": "Eve", "secretKey": 5}, {"name": "Fay", "secretKey": "fay"}])
+
+    assert result["errors"] == [{"row": 1, "name": "Eve", "error": "Secret key must be a string"}]
+    assert [user["name"] for user in result["created"]] == ["Fay"]
+    assert db.users.find_one({"name": "Eve"}) is None